@@ -0,0 +1,161 @@
+import numpy as np
+import pandas as pd
+
+from typing import List, NamedTuple
+from pandas import DataFrame
+
+
+class Fills(NamedTuple):
+    index: np.ndarray
+    price: np.ndarray
+    share: np.ndarray
+    fee: np.ndarray
+    slippage: np.ndarray
+
+
+class PortfolioEngine:
+    """
+    Array-backed portfolio, holding shares, cost and last price of every code in numpy arrays indexed by code id.
+    Orders are applied as whole vectors per bar: slippage, service charge, lot-size rounding and cash checks are
+    vectorized, sells are always executed before buys so the proceeds can be reused in the same bar.
+    Shares are counted in stocks (not lots), cost is the total cost paid for the current shares including fees.
+    """
+    def __init__(self, init_balance: float = 1000000.0, slippage: float = 0.03, charge: float = 0.0005,
+                 lot_size: int = 100, capacity: int = 1024):
+        """
+        :param init_balance: initial balance, default: 1 million
+        :param slippage: transaction error ratio, buy at price * (1 + slippage) and sell at price * (1 - slippage)
+        :param charge: service charge ratio of the transaction amount
+        :param lot_size: minimum trading unit, odd lots can only be sold when closing the whole holding, default: 100
+        :param capacity: initial number of codes allocated, arrays grow automatically
+        """
+        assert slippage >= 0. and charge >= 0., "Fees cannot be negative."
+        assert lot_size > 0 and capacity > 0, "Lot size and capacity should be positive."
+        self.init_balance = init_balance
+        self.cash = init_balance
+        self.slippage = slippage
+        self.charge = charge
+        self.lot_size = lot_size
+        self.codes = []
+        self.code_ids = {}
+        self.shares = np.zeros(capacity, dtype=np.int64)
+        self.cost = np.zeros(capacity, dtype=np.float64)
+        self.price = np.zeros(capacity, dtype=np.float64)
+
+    @property
+    def size(self) -> int:
+        return len(self.codes)
+
+    def index(self, codes: List) -> np.ndarray:
+        """
+        Map codes to code ids, unseen codes are registered with empty holdings.
+        """
+        for code in codes:
+            if code not in self.code_ids:
+                self.code_ids[code] = len(self.codes)
+                self.codes.append(code)
+        if self.size > len(self.shares):
+            capacity = max(self.size, 2 * len(self.shares))
+            self.shares = np.concatenate([self.shares, np.zeros(capacity - len(self.shares), dtype=np.int64)])
+            self.cost = np.concatenate([self.cost, np.zeros(capacity - len(self.cost), dtype=np.float64)])
+            self.price = np.concatenate([self.price, np.zeros(capacity - len(self.price), dtype=np.float64)])
+        return np.array([self.code_ids[code] for code in codes], dtype=np.int64)
+
+    @property
+    def market_value(self) -> float:
+        return float(self.shares[: self.size] @ self.price[: self.size])
+
+    @property
+    def equity(self) -> float:
+        return self.cash + self.market_value
+
+    def mark(self, codes: List, prices: np.ndarray):
+        """
+        Mark to market with the latest prices, NaN prices (eg: suspension) keep the previous ones.
+        """
+        idx = self.index(codes)
+        prices = np.asarray(prices, dtype=np.float64)
+        valid = np.isfinite(prices)
+        self.price[idx[valid]] = prices[valid]
+
+    def order(self, codes: List, shares: np.ndarray, prices: np.ndarray, policy: str = 'scale') -> Fills:
+        """
+        Execute an order vector at the given prices.
+        :param codes: stock codes, each code appears at most once
+        :param shares: signed shares, positive for buy and negative for sell. Buys are rounded down to lots, sells
+        are clipped to the holding and rounded down to lots unless closing the whole holding.
+        :param prices: transaction prices before slippage, orders with NaN prices are skipped
+        :param policy: what to do when cash is insufficient for all the buys: ['scale', 'prefix'], default: 'scale'.
+        'scale' shrinks every buy by the same ratio, 'prefix' executes buys in order until the first unaffordable one.
+        :return: executed fills
+        """
+        assert policy in ['scale', 'prefix'], f"{policy} is not a cash policy."
+        idx = self.index(codes)
+        assert len(np.unique(idx)) == len(idx), "Codes in one order should be unique."
+        shares = np.asarray(shares, dtype=np.float64)
+        prices = np.asarray(prices, dtype=np.float64)
+        valid = np.isfinite(prices) & np.isfinite(shares)
+        shares = np.where(valid, shares, 0.).astype(np.int64)
+        prices = np.where(valid, prices, 0.)
+        self.price[idx[valid]] = prices[valid]
+        lot = self.lot_size
+
+        held = self.shares[idx]
+        sell = np.minimum(np.maximum(-shares, 0), held)
+        sell = np.where(sell == held, sell, sell // lot * lot)
+        sell_price = prices * (1. - self.slippage)
+        proceeds = sell_price * sell
+        sell_fee = proceeds * self.charge
+        self.cash += float(np.sum(proceeds - sell_fee))
+        remain = np.divide(held - sell, held, out=np.zeros(len(held)), where=held > 0)
+        self.cost[idx] *= remain
+        self.shares[idx] -= sell
+
+        buy = np.maximum(shares, 0) // lot * lot
+        buy_price = prices * (1. + self.slippage)
+        amount = buy_price * buy * (1. + self.charge)
+        if policy == 'prefix':
+            buy = buy * np.cumprod(np.cumsum(amount) <= self.cash)
+        elif np.sum(amount) > self.cash:
+            ratio = max(self.cash, 0.) / np.sum(amount)
+            buy = np.floor(buy * ratio / lot).astype(np.int64) * lot
+        amount = buy_price * buy * (1. + self.charge)
+        self.cash -= float(np.sum(amount))
+        self.cost[idx] += amount
+        self.shares[idx] += buy
+
+        sold = sell > 0
+        bought = buy > 0
+        return Fills(index=np.concatenate([idx[sold], idx[bought]]),
+                     price=np.concatenate([sell_price[sold], buy_price[bought]]),
+                     share=np.concatenate([-sell[sold], buy[bought]]),
+                     fee=np.concatenate([sell_fee[sold], (amount - buy_price * buy)[bought]]),
+                     slippage=np.concatenate([((prices - sell_price) * sell)[sold],
+                                              ((buy_price - prices) * buy)[bought]]))
+
+    def rebalance(self, codes: List, weights: np.ndarray, prices: np.ndarray) -> Fills:
+        """
+        Trade to target weights of the current equity, codes not in the list keep their holdings.
+        :param codes: stock codes, each code appears at most once
+        :param weights: target weights, 0 to close the holding
+        :param prices: transaction prices before slippage
+        :return: executed fills
+        """
+        self.mark(codes, prices)
+        idx = self.index(codes)
+        prices = np.asarray(prices, dtype=np.float64)
+        # leave room for the slippage and service charge of buys
+        unit = prices * (1. + self.slippage) * (1. + self.charge)
+        target = np.floor(np.asarray(weights, dtype=np.float64) * self.equity / unit / self.lot_size) * self.lot_size
+        return self.order(codes, target - self.shares[idx], prices)
+
+    def to_frame(self) -> DataFrame:
+        """
+        :return: current holdings with share, cost price, price, market value and profit, indexed by code
+        """
+        held = np.flatnonzero(self.shares[: self.size])
+        shares = self.shares[held]
+        market_value = shares * self.price[held]
+        return pd.DataFrame({"share": shares, "cost_price": self.cost[held] / shares, "price": self.price[held],
+                             "market_value": market_value, "profit": market_value - self.cost[held]},
+                            index=pd.Index([self.codes[i] for i in held], name="code"))
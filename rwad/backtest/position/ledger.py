@@ -0,0 +1,135 @@
+import os
+import numpy as np
+import pandas as pd
+
+from typing import List, Dict
+from pandas import DataFrame
+from rwad.backtest.position.engine import Fills
+
+
+class Ledger:
+    """
+    Columnar trade ledger, fills are appended to fixed-size chunks of typed arrays, so appending is amortized O(1)
+    and a fill costs 45 bytes instead of a Python object.
+    Full chunks can be spilled to disk as .npy files and are then read back by memory mapping.
+    Columns: code (int32 code id), price (transaction price after slippage), share (unsigned), side (1 for buy and
+    -1 for sell), fee (service charge), slippage (slippage cost) and timestamp (epoch seconds, 0 if not recorded).
+    """
+    fields = [("code", np.int32), ("price", np.float64), ("share", np.int64), ("side", np.int8),
+              ("fee", np.float64), ("slippage", np.float64), ("timestamp", np.int64)]
+
+    def __init__(self, chunk_size: int = 65536, spill_dir: str = None, max_chunks: int = 16):
+        """
+        :param chunk_size: fills per chunk, default: 65536
+        :param spill_dir: directory full chunks are spilled to, default: None (keep everything in memory)
+        :param max_chunks: maximum full chunks kept in memory before spilling, default: 16
+        """
+        assert chunk_size > 0 and max_chunks >= 0, "Chunk size should be positive."
+        self.chunk_size = chunk_size
+        self.spill_dir = spill_dir
+        self.max_chunks = max_chunks
+        self.chunks = []
+        self.spilled = 0
+        self.cursor = chunk_size
+        if spill_dir is not None:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def __len__(self):
+        return (len(self.chunks) - 1) * self.chunk_size + self.cursor if self.chunks else 0
+
+    def new_chunk(self):
+        self.chunks.append({name: np.zeros(self.chunk_size, dtype=dtype) for name, dtype in self.fields})
+        self.cursor = 0
+        if self.spill_dir is not None and len(self.chunks) - 1 - self.spilled > self.max_chunks:
+            self.spill()
+
+    def spill(self):
+        """
+        Write the oldest full chunk in memory to disk and replace it by memory-mapped arrays.
+        """
+        chunk = {}
+        for name, _ in self.fields:
+            path = os.path.join(self.spill_dir, f"{self.spilled}_{name}.npy")
+            np.save(path, self.chunks[self.spilled][name])
+            chunk[name] = np.load(path, mmap_mode='r')
+        self.chunks[self.spilled] = chunk
+        self.spilled += 1
+
+    def append(self, code: int, price: float, share: int, side: int, fee: float = 0., slippage: float = 0.,
+               timestamp: int = 0):
+        """
+        Append one fill.
+        """
+        if self.cursor == self.chunk_size:
+            self.new_chunk()
+        chunk = self.chunks[-1]
+        i = self.cursor
+        chunk["code"][i] = code
+        chunk["price"][i] = price
+        chunk["share"][i] = share
+        chunk["side"][i] = side
+        chunk["fee"][i] = fee
+        chunk["slippage"][i] = slippage
+        chunk["timestamp"][i] = timestamp
+        self.cursor += 1
+
+    def extend(self, columns: Dict):
+        """
+        Append many fills at once.
+        :param columns: a dict of arrays with the same length, keyed by the ledger columns. Scalars are broadcast.
+        """
+        size = max(np.size(values) for values in columns.values())
+        columns = {name: np.broadcast_to(columns.get(name, 0), size) for name, _ in self.fields}
+        start = 0
+        while start < size:
+            if self.cursor == self.chunk_size:
+                self.new_chunk()
+            n = min(size - start, self.chunk_size - self.cursor)
+            chunk = self.chunks[-1]
+            for name, _ in self.fields:
+                chunk[name][self.cursor: self.cursor + n] = columns[name][start: start + n]
+            self.cursor += n
+            start += n
+
+    def record(self, fills: Fills, timestamp: int = 0):
+        """
+        Append the fills returned by PortfolioEngine.order().
+        """
+        self.extend({"code": fills.index, "price": fills.price, "share": np.abs(fills.share),
+                     "side": np.sign(fills.share), "fee": fills.fee, "slippage": fills.slippage,
+                     "timestamp": timestamp})
+
+    def columns(self) -> List:
+        """
+        :return: list of chunks, each chunk is a dict of arrays trimmed to the fills it holds (views, not copies)
+        """
+        return [{name: chunk[name][: self.chunk_size if i < len(self.chunks) - 1 else self.cursor]
+                 for name, _ in self.fields} for i, chunk in enumerate(self.chunks)]
+
+    def column(self, name: str) -> np.ndarray:
+        chunks = [chunk[name] for chunk in self.columns()]
+        if len(chunks) == 1:
+            return chunks[0]
+        return np.concatenate(chunks) if chunks else np.zeros(0, dtype=dict(self.fields)[name])
+
+    def to_frame(self, codes: List = None) -> DataFrame:
+        """
+        Export to a dataframe, arrays are not copied when the ledger holds a single chunk.
+        :param codes: codes indexed by code id, eg: PortfolioEngine.codes, default: None (keep code ids)
+        :return: dataframe of fills
+        """
+        df = pd.DataFrame({name: self.column(name) for name, _ in self.fields}, copy=False)
+        if codes is not None:
+            df["code"] = np.array(codes, dtype=object)[df["code"].to_numpy()]
+        return df
+
+    def to_arrow(self):
+        """
+        Export to a pyarrow table without copying, each chunk becomes a record batch.
+        """
+        import pyarrow as pa
+
+        batches = [pa.RecordBatch.from_arrays([pa.array(chunk[name]) for name, _ in self.fields],
+                                              names=[name for name, _ in self.fields]) for chunk in self.columns()]
+        schema = pa.schema([(name, pa.from_numpy_dtype(dtype)) for name, dtype in self.fields])
+        return pa.Table.from_batches(batches, schema=schema)
@@ -1,8 +1,14 @@
 from typing import List, Dict
 import time
 
+from rwad.backtest.position.engine import PortfolioEngine
+from rwad.backtest.position.ledger import Ledger
+from rwad.metrics import Metrics
+
 
 class Bill:
+    __slots__ = ["code", "transaction_price", "share", "timestamp"]
+
     def __init__(self, code: str, transaction_price: float, share: int, timestamp: str = None):
         self.code = code
         self.transaction_price = transaction_price
@@ -14,6 +20,8 @@ class Bill:
 
 
 class Holding:
+    __slots__ = ["code", "share", "cost_price", "price", "profit"]
+
     def __init__(self, code: str, share: int, cost_price: float, price: float, profit: float):
         self.code = code
         self.share = share
@@ -29,50 +37,109 @@ class Holding:
 
 
 class Position:
-    def __init__(self, init_balance: float = 1000000.0, slippage: float = 0.03, charge: float = 0.0005):
+    def __init__(self, init_balance: float = 1000000.0, slippage: float = 0.03, charge: float = 0.0005,
+                 metrics: Metrics = None):
         """
         This class is used to simulate actual account positions.
+        It is a thin facade of PortfolioEngine, use the engine directly to trade whole order vectors per bar.
         :param init_balance: initial balance, defalut: 10 million
         :param slippage: transaction error, greater than 0.0
         :param charge: service charges need to be paid by securities firms when trading, greater than 0.0
+        :param metrics: hook receiving the fills and duration of buy(), sell() and update(), default: None (no-op)
         """
         assert slippage >= 0. and charge >= 0., "Fees cannot be negative."
 
+        self.init_balance = init_balance
         self.balance = init_balance
         self.slippage = slippage
         self.charge = charge
         self.total_assets = self.balance
         self.total_profit = 0.
         self.holdings = {}
-        self.bills = []
+        self.engine = PortfolioEngine(init_balance, slippage, charge)
+        self.ledger = Ledger()
+        self.metrics = metrics if metrics is not None else Metrics()
         # TODO: portfolio combination risk control may be implemented in the future.
         # self.sharpe_ratio = 0.0
 
     def buy(self, operations: List[Bill], time_rec: bool = True):
-        for bill in operations:
-            code, price, share, timestamp = bill.exact()
-            fixed_price = price * (1. + self.slippage) * (1. + self.charge)
-            amount = share * 100 * fixed_price
-            if self.balance < amount:
-                return
-            self.balance -= amount
-            if code in self.holdings.keys():
-                stock = self.holdings[code]
-                new_cost_price = (stock.cost_price * stock.share + fixed_price * share) / (stock.share + share)
-                new_share = stock.share + share
-                self.holdings[code].update(new_share, new_cost_price, price,
-                                           self.holdings[code].profit - (fixed_price - price) * share)
-            else:
-                self.holdings[code] = Holding(code, share, fixed_price, price, -(fixed_price - price) * share)
-            if time_rec is True:
-                self.bills.append(Bill(code, fixed_price, share, time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())))
-            else:
-                self.bills.append(Bill(code, fixed_price, share))
-            self.total_assets -= (fixed_price - price) * share
-            self.update()
+        """
+        Buy stocks, bills are executed in order and buying stops at the first one the balance can't afford.
+        :param operations: bills with transaction price and share (in lots)
+        :param time_rec: record the time of the bills or not
+        """
+        self.trade(operations, 1, time_rec)
+
+    def sell(self, operations: List[Bill], time_rec: bool = True):
+        """
+        Sell stocks, shares more than the holding are ignored.
+        :param operations: bills with transaction price and share (in lots)
+        :param time_rec: record the time of the bills or not
+        """
+        self.trade(operations, -1, time_rec)
+
+    def trade(self, operations: List[Bill], side: int, time_rec: bool):
+        lot = self.engine.lot_size
+        timestamp = int(time.time()) if time_rec is True else 0
+        clock = time.perf_counter() if self.metrics.enabled else 0.
+        filled = 0
+        start = 0
+
+        while start < len(operations):
+            # the engine takes each code once per order, so split the bills into runs of distinct codes
+            codes = set()
+            end = start
+            while end < len(operations) and operations[end].code not in codes:
+                codes.add(operations[end].code)
+                end += 1
+            batch = operations[start: end]
+            fills = self.engine.order([bill.code for bill in batch], [side * bill.share * lot for bill in batch],
+                                      [bill.transaction_price for bill in batch], policy='prefix')
+            self.ledger.record(fills, timestamp)
+            filled += len(fills.index)
+            if side > 0 and len(fills.index) < sum(bill.share > 0 for bill in batch):
+                break
+            start = end
+        if self.metrics.enabled:
+            self.metrics.operation("buy" if side > 0 else "sell", filled, time.perf_counter() - clock)
+        self.update()
 
-    def sell(self, operations: List[Bill]):
-        pass
+    @property
+    def bills(self) -> List[Bill]:
+        """
+        Bills rebuilt from the ledger, use self.ledger directly to analyse long backtests.
+        The price of a bill is the price paid (received) per share after slippage and service charge.
+        """
+        bills = []
+        for chunk in self.ledger.columns():
+            for code, price, share, side, fee, timestamp in zip(chunk["code"], chunk["price"], chunk["share"],
+                                                                 chunk["side"], chunk["fee"], chunk["timestamp"]):
+                timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp)) if timestamp else None
+                bills.append(Bill(self.engine.codes[code], float(price + side * fee / share),
+                                  int(share) // self.engine.lot_size, timestamp))
+        return bills
 
-    def update(self):
-        pass
\ No newline at end of file
+    def update(self, prices: Dict[str, float] = None):
+        """
+        Mark to market and refresh the balance, total assets, total profit and holdings.
+        :param prices: latest prices of codes, default: None (keep the last transaction prices)
+        """
+        clock = time.perf_counter() if self.metrics.enabled else 0.
+        if prices is not None:
+            self.engine.mark(list(prices.keys()), list(prices.values()))
+        self.balance = self.engine.cash
+        self.total_assets = self.engine.equity
+        self.total_profit = self.total_assets - self.init_balance
+
+        holdings = {}
+        for code, row in self.engine.to_frame().iterrows():
+            stock = self.holdings.get(code)
+            share = int(row["share"]) // self.engine.lot_size
+            if stock is None:
+                stock = Holding(code, share, row["cost_price"], row["price"], row["profit"])
+            else:
+                stock.update(share, row["cost_price"], row["price"], row["profit"])
+            holdings[code] = stock
+        self.holdings = holdings
+        if self.metrics.enabled:
+            self.metrics.operation("update", len(holdings), time.perf_counter() - clock)
@@ -0,0 +1,236 @@
+import datetime
+import numpy as np
+import pandas as pd
+
+from typing import Callable, Dict, List, NamedTuple, Optional
+from pandas import DataFrame
+from rwad.backtest.position.position import Position
+from rwad.data.store.panel import Panel
+from rwad.data.store.tick_store import TickStore
+
+
+class Bar(NamedTuple):
+    time: object
+    index: np.ndarray
+    codes: np.ndarray
+    fields: Dict
+
+
+class Order(NamedTuple):
+    codes: List
+    shares: Optional[np.ndarray] = None
+    weights: Optional[np.ndarray] = None
+    prices: Optional[np.ndarray] = None
+
+
+class FrameSource:
+    """
+    Replay a dict of bar dataframes, eg: the output of DataCollector.get_batch_historical_data() or
+    BarCache.get_batch_historical_data(), in time order across all the codes.
+    Bars are streamed by a k-way merge of the codes: each code converts only chunk_size rows at a time, and all the
+    buffered bars up to the earliest chunk end are merged at once. Memory stays bounded by (codes x chunk_size) bars
+    whatever the length of the history, no aligned panel is built.
+    """
+    def __init__(self, df_dict: Dict, time_column: str = "日期", fields: List = None, chunk_size: int = 4096):
+        """
+        :param df_dict: a dict of dataframe keyed by stock code
+        :param time_column: column of bar time, values should sort in time order, default: '日期'
+        :param fields: numeric columns replayed, default: None (for all the columns of the first dataframe except
+        time_column, '股票代码' and '名称')
+        :param chunk_size: rows of a code converted at a time, default: 4096
+        """
+        assert chunk_size > 0, f"chunk_size {chunk_size} should be positive."
+        self.df_dict = df_dict
+        self.codes = list(df_dict.keys())
+        self.time_column = time_column
+        self.chunk_size = chunk_size
+        if fields is None:
+            frames = [df for df in df_dict.values() if len(df) > 0]
+            fields = [column for column in frames[0].columns if column not in [time_column, "股票代码", "名称"]] \
+                if frames else []
+        self.fields = fields
+
+    def chunks(self, df: DataFrame):
+        """
+        Stream the bars of one code as (times, (rows x fields) values) chunks, in time order.
+        """
+        times = df[self.time_column].to_numpy()
+        order = None
+        if len(times) > 1 and not pd.Index(times).is_monotonic_increasing:
+            order = np.argsort(times, kind='stable')
+        for start in range(0, len(df), self.chunk_size):
+            rows = slice(start, start + self.chunk_size) if order is None else order[start: start + self.chunk_size]
+            chunk = df.iloc[rows]
+            values = np.zeros((len(chunk), len(self.fields)))
+            for j, field in enumerate(self.fields):
+                values[:, j] = pd.to_numeric(chunk[field], errors='coerce').to_numpy(np.float64)
+            yield chunk[self.time_column].to_numpy(), values
+
+    def __iter__(self):
+        codes = np.array(self.codes, dtype=object)
+        streams = [self.chunks(df) for df in self.df_dict.values()]
+        buffers = [None] * len(streams)
+        while True:
+            for i, stream in enumerate(streams):
+                if stream is not None and (buffers[i] is None or len(buffers[i][0]) == 0):
+                    buffers[i] = next(stream, None)
+                    if buffers[i] is None:
+                        streams[i] = None
+            active = [i for i, buffer in enumerate(buffers) if buffer is not None and len(buffer[0]) > 0]
+            if not active:
+                return
+            # every bar not later than the earliest chunk end is buffered, merge them at once
+            frontier = min(buffers[i][0][-1] for i in active)
+            times, index, values = [], [], []
+            for i in active:
+                buffer_times, buffer_values = buffers[i]
+                k = int(np.searchsorted(buffer_times, frontier, side='right'))
+                times.append(buffer_times[:k])
+                index.append(np.full(k, i, dtype=np.int32))
+                values.append(buffer_values[:k])
+                buffers[i] = (buffer_times[k:], buffer_values[k:])
+            times = np.concatenate(times)
+            order = np.argsort(times, kind='stable')
+            times, index, values = times[order], np.concatenate(index)[order], np.concatenate(values)[order]
+            bounds = np.concatenate([[0], np.flatnonzero(times[1:] != times[:-1]) + 1, [len(times)]])
+            for start, end in zip(bounds[:-1], bounds[1:]):
+                yield Bar(times[start], index[start: end], codes[index[start: end]],
+                          {field: values[start: end, j] for j, field in enumerate(self.fields)})
+
+
+class PanelSource:
+    """
+    Replay an aligned Panel date by date, codes without a bar on a date are skipped.
+    Fields are views of the panel arrays, so a memory-mapped panel is never loaded as a whole.
+    """
+    def __init__(self, panel: Panel, fields: List = None):
+        """
+        :param panel: aligned panel, eg: Panel.load(path)
+        :param fields: fields replayed, default: None (for all the fields)
+        """
+        self.panel = panel
+        self.codes = panel.codes
+        self.fields = fields if fields is not None else panel.fields
+
+    def __iter__(self):
+        codes = np.array(self.codes, dtype=object)
+        columns = [self.panel.fields.index(field) for field in self.fields]
+        for i, date in enumerate(self.panel.dates):
+            index = np.flatnonzero(self.panel.mask[i])
+            values = self.panel.values[i]
+            yield Bar(date, index, codes[index],
+                      {field: values[index, column] for field, column in zip(self.fields, columns)})
+
+
+class StoreSource:
+    """
+    Replay a TickStore partition by partition, rows of the same snapshot form one bar.
+    Fields are slices of the memory-mapped columns, so memory stays bounded whatever the size of the store.
+    """
+    def __init__(self, store: TickStore, start: int = None, end: int = None, fields: List = None):
+        """
+        :param store: tick store
+        :param start: start snapshot time (inclusive), form: YYYYmmddHHMMSS, default: None (from the beginning)
+        :param end: end snapshot time (inclusive), form: YYYYmmddHHMMSS, default: None (till the end)
+        :param fields: columns replayed, default: None (for all the columns)
+        """
+        self.store = store
+        self.codes = list(store.codes)
+        self.start = start
+        self.end = end
+        self.fields = fields if fields is not None else store.columns
+
+    def __iter__(self):
+        codes = np.array(self.codes, dtype=object)
+        for date in self.store.dates():
+            if (self.start is not None and int(date) < self.start // 1000000) or \
+                    (self.end is not None and int(date) > self.end // 1000000):
+                continue
+            data = self.store.partition(date)
+            snapshots = data["snapshot"]
+            lo = 0 if self.start is None else int(np.searchsorted(snapshots, self.start, side='left'))
+            hi = len(snapshots) if self.end is None else int(np.searchsorted(snapshots, self.end, side='right'))
+            bounds = np.concatenate([[lo], np.flatnonzero(np.diff(snapshots[lo: hi])) + lo + 1, [hi]])
+            for start, end in zip(bounds[:-1], bounds[1:]):
+                if start == end:
+                    continue
+                index = np.asarray(data["code"][start: end])
+                yield Bar(int(snapshots[start]), index, codes[index],
+                          {field: data[field][start: end] for field in self.fields})
+
+
+class Backtester:
+    """
+    Event-driven backtest: bars are streamed from a source in time order, the strategy is called once per bar time
+    with all the codes of that time, and its orders are executed by the PortfolioEngine of a Position at the
+    price of the current bar.
+    Usage:
+        def strategy(bar: Bar, engine: PortfolioEngine) -> Optional[Order]:
+            return Order(list(bar.codes), weights=np.full(len(bar.codes), 1. / len(bar.codes)))
+        equity = Backtester(FrameSource(df_dict), strategy).run()
+    """
+    def __init__(self, source, strategy: Callable, position: Position = None, price_field: str = "收盘价"):
+        """
+        :param source: FrameSource, PanelSource, StoreSource or any iterable of Bar with a 'codes' list attribute
+        :param strategy: callback(bar, engine) returning an Order or None
+        :param position: simulated account, default: Position()
+        :param price_field: field used to mark to market and as default transaction price, default: '收盘价'
+        """
+        self.source = source
+        self.strategy = strategy
+        self.position = position if position is not None else Position()
+        self.price_field = price_field
+        self.bars = 0
+
+    @staticmethod
+    def epoch(time) -> int:
+        """
+        Convert a bar time ('YYYY-mm-dd', YYYYmmddHHMMSS or datetime-like) to epoch seconds for the ledger.
+        """
+        if isinstance(time, (int, np.integer)):
+            return int(datetime.datetime.strptime(str(time), '%Y%m%d%H%M%S').timestamp())
+        if isinstance(time, np.str_):
+            # pd.Timestamp() rejects numpy strings, eg: the times of FrameSource bars
+            time = str(time)
+        return int(pd.Timestamp(time).timestamp())
+
+    def execute(self, order: Order, time) -> None:
+        engine = self.position.engine
+        prices = order.prices
+        if prices is None:
+            prices = engine.price[engine.index(order.codes)]
+        if order.weights is not None:
+            fills = engine.rebalance(order.codes, order.weights, prices)
+        else:
+            fills = engine.order(order.codes, order.shares, prices)
+        if len(fills.index) > 0:
+            self.position.ledger.record(fills, self.epoch(time))
+
+    def run(self) -> DataFrame:
+        """
+        :return: equity curve indexed by bar time, with cash, market value and equity
+        """
+        engine = self.position.engine
+        mapping = engine.index(self.source.codes)
+        times = []
+        cash = []
+        market_value = []
+
+        for bar in self.source:
+            idx = mapping[bar.index]
+            prices = np.asarray(bar.fields[self.price_field], dtype=np.float64)
+            valid = np.isfinite(prices) & (prices > 0.)
+            engine.price[idx[valid]] = prices[valid]
+            self.bars += len(idx)
+
+            order = self.strategy(bar, engine)
+            if order is not None:
+                self.execute(order, bar.time)
+            times.append(bar.time)
+            cash.append(engine.cash)
+            market_value.append(engine.market_value)
+
+        self.position.update()
+        market_value = np.array(market_value)
+        return pd.DataFrame({"cash": cash, "market_value": market_value, "equity": np.array(cash) + market_value},
+                            index=pd.Index(times, name="time"))
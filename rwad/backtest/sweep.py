@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+import itertools
+import numpy as np
+import pandas as pd
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Union
+from pandas import DataFrame, Series
+from rwad.data.store.panel import Panel
+
+# panel attached by each worker process, see attach()
+shared_panel = None
+
+
+def attach(path: str):
+    global shared_panel
+    shared_panel = Panel.load(path, mmap=True)
+
+
+def execute(func: Callable, params: Dict, seed: int) -> Series:
+    np.random.seed(seed)
+    return func(shared_panel, params, seed)
+
+
+def summarize(equity: Series, periods: int = 252) -> Dict:
+    """
+    Summary statistics of an equity curve.
+    :param equity: equity indexed by bar time
+    :param periods: bars per year, default: 252 (for day)
+    :return: total return, annual return, annual volatility, sharpe ratio and max drawdown
+    """
+    equity = np.asarray(equity, dtype=np.float64)
+    if len(equity) < 2:
+        return {"total_return": 0., "annual_return": 0., "annual_volatility": 0., "sharpe": np.nan,
+                "max_drawdown": 0.}
+    returns = equity[1:] / equity[:-1] - 1.
+    total = equity[-1] / equity[0] - 1.
+    volatility = float(np.std(returns, ddof=1) * np.sqrt(periods)) if len(returns) > 1 else 0.
+    return {"total_return": total,
+            "annual_return": (1. + total) ** (periods / len(returns)) - 1.,
+            "annual_volatility": volatility,
+            "sharpe": float(np.mean(returns) * periods / volatility) if volatility > 0. else np.nan,
+            "max_drawdown": float(np.max(1. - equity / np.maximum.accumulate(equity)))}
+
+
+class ParameterSweep:
+    """
+    Run one backtest per parameter combination in a process pool.
+    The market data is written once as a memory-mapped Panel (under /dev/shm when available), every worker
+    attaches to it read-only, so all the workers share the same physical pages instead of reloading the data.
+    Usage:
+        def run(panel: Panel, params: Dict, seed: int) -> Series:
+            position = Position()
+            equity = Backtester(PanelSource(panel), make_strategy(**params), position).run()
+            return equity["equity"]
+        stats = ParameterSweep(panel).run(run, {"window": [5, 10, 20], "top": [0.1, 0.2]})
+    """
+    def __init__(self, panel: Union[Panel, str], workers: int = None, seed: int = 0, periods: int = 252):
+        """
+        :param panel: panel, or the directory of a saved panel
+        :param workers: worker processes, default: None (for the number of CPUs)
+        :param seed: base seed, run i always gets the same seed derived from it
+        :param periods: bars per year used by the summary statistics, default: 252 (for day)
+        """
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.seed = seed
+        self.periods = periods
+        self.curves = {}
+        if isinstance(panel, str):
+            self.path = panel
+            self.temporary = False
+        else:
+            self.path = tempfile.mkdtemp(prefix="rwad_panel_", dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+            self.temporary = True
+            panel.save(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        if self.temporary and os.path.exists(self.path):
+            shutil.rmtree(self.path)
+
+    @staticmethod
+    def combinations(grid: Union[Dict, List]) -> List[Dict]:
+        """
+        :param grid: a dict of candidate lists keyed by parameter name (cartesian product), or a list of dicts
+        """
+        if isinstance(grid, dict):
+            return [dict(zip(grid.keys(), values)) for values in itertools.product(*grid.values())]
+        return list(grid)
+
+    def run(self, func: Callable, grid: Union[Dict, List]) -> DataFrame:
+        """
+        :param func: module-level function(panel, params, seed) returning the equity curve of one backtest,
+        np.random is also seeded with the same seed before the call
+        :param grid: parameter grid, see combinations()
+        :return: summary statistics, one row per combination; equity curves are kept in self.curves by run id
+        """
+        params = self.combinations(grid)
+        seeds = [int(seed.generate_state(1)[0]) for seed in np.random.SeedSequence(self.seed).spawn(len(params))]
+
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=attach, initargs=(self.path,)) as pool:
+            curves = list(pool.map(execute, [func] * len(params), params, seeds))
+
+        rows = []
+        for i, (param, seed, curve) in enumerate(zip(params, seeds, curves)):
+            self.curves[i] = curve
+            rows.append({**param, "seed": seed, **summarize(curve, self.periods)})
+        return pd.DataFrame(rows)
@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+
+from typing import List
+from pandas import DataFrame, Series
+
+
+class BarAggregator:
+    """
+    Build OHLCV + VWAP bars of many codes from the real time snapshot stream (clean() or bulk_clean() output).
+    The state of every code is kept in numpy arrays indexed by code id, each snapshot updates all its codes at once.
+    - Bars are aligned to the trading sessions 09:30-11:30 and 13:00-15:00, so there is no bar across the lunch
+      break: ticks of the call auction belong to the first bar, ticks during lunch break to the last morning bar and
+      ticks after 15:00 to the last bar.
+    - Volume and amount of a bar are the increments of the cumulative '成交量' and '成交额', a cumulative value
+      lower than the previous one (a new day or a reset of the provider) restarts counting from 0.
+    - The first tick of a code is only a baseline (no volume), since the cumulative values include the trades before
+      the aggregator started, unless it falls in the call auction or the first bar, where they all belong.
+    - Ticks not newer than the last tick of the code (late or repeated quotes) are ignored.
+    """
+    def __init__(self, interval: int = 1, volume_unit: float = 100., amount_unit: float = 10000.,
+                 capacity: int = 1024):
+        """
+        :param interval: bar interval in minutes, a divisor of 120, eg: 1, 5, 30, default: 1
+        :param volume_unit: stocks per unit of '成交量', default: 100 (for lot)
+        :param amount_unit: yuan per unit of '成交额', default: 10000 (for 10 thousand yuan)
+        :param capacity: initial number of codes allocated, arrays grow automatically
+        """
+        assert interval > 0 and 120 % interval == 0, f"Interval {interval} should be a divisor of 120 minutes."
+        self.interval = interval
+        self.volume_unit = volume_unit
+        self.amount_unit = amount_unit
+        self.codes = []
+        self.code_ids = {}
+        self.bar = np.full(capacity, -1, dtype=np.int64)
+        self.last_time = np.zeros(capacity, dtype=np.int64)
+        self.last_volume = np.zeros(capacity, dtype=np.float64)
+        self.last_amount = np.zeros(capacity, dtype=np.float64)
+        self.ohlc = np.zeros((capacity, 4), dtype=np.float64)
+        self.volume = np.zeros(capacity, dtype=np.float64)
+        self.amount = np.zeros(capacity, dtype=np.float64)
+
+    def index(self, codes: List) -> np.ndarray:
+        for code in codes:
+            if code not in self.code_ids:
+                self.code_ids[code] = len(self.codes)
+                self.codes.append(code)
+        if len(self.codes) > len(self.bar):
+            grow = max(len(self.codes), 2 * len(self.bar)) - len(self.bar)
+            self.bar = np.concatenate([self.bar, np.full(grow, -1, dtype=np.int64)])
+            for name in ["last_time", "last_volume", "last_amount", "volume", "amount"]:
+                array = getattr(self, name)
+                setattr(self, name, np.concatenate([array, np.zeros(grow, dtype=array.dtype)]))
+            self.ohlc = np.concatenate([self.ohlc, np.zeros((grow, 4))])
+        return np.array([self.code_ids[code] for code in codes], dtype=np.int64)
+
+    def bar_of(self, timestamp: np.ndarray) -> np.ndarray:
+        """
+        Map timestamps (YYYYmmddHHMMSS) to bar keys: YYYYmmdd * 1000 + bar number of the day.
+        """
+        minute = timestamp % 1000000 // 10000 * 60 + timestamp % 10000 // 100
+        offset = np.where(minute < 690, minute - 570, np.where(minute < 780, 119, minute - 660))
+        return timestamp // 1000000 * 1000 + np.clip(offset, 0, 239) // self.interval
+
+    def time_of(self, bar: np.ndarray) -> np.ndarray:
+        """
+        Map bar keys to the start time of the bars, form: YYYYmmddHHMMSS.
+        """
+        offset = bar % 1000 * self.interval
+        minute = np.where(offset < 120, offset + 570, offset + 660)
+        return bar // 1000 * 1000000 + minute // 60 * 10000 + minute % 60 * 100
+
+    def emit(self, idx: np.ndarray) -> DataFrame:
+        ohlc = self.ohlc[idx]
+        volume = self.volume[idx]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            vwap = self.amount[idx] * self.amount_unit / (volume * self.volume_unit)
+        return pd.DataFrame({"code": np.array(self.codes, dtype=object)[idx], "time": self.time_of(self.bar[idx]),
+                             "open": ohlc[:, 0], "high": ohlc[:, 1], "low": ohlc[:, 2], "close": ohlc[:, 3],
+                             "volume": volume, "amount": self.amount[idx], "vwap": vwap})
+
+    def update(self, df: DataFrame) -> DataFrame:
+        """
+        Consume one snapshot of many codes.
+        :param df: snapshot indexed by stock code, with '现价', '成交量', '成交额' and '时间戳'
+        :return: bars completed by this snapshot
+        """
+        idx = self.index(list(df.index))
+        price = df["现价"].to_numpy(dtype=np.float64)
+        volume = df["成交量"].to_numpy(dtype=np.float64)
+        amount = df["成交额"].to_numpy(dtype=np.float64)
+        timestamp = df["时间戳"].to_numpy(dtype=np.float64)
+        valid = np.isfinite(price) & np.isfinite(timestamp) & (price > 0.)
+        timestamp = np.where(valid, timestamp, 0).astype(np.int64)
+        valid &= timestamp > self.last_time[idx]
+        idx, price, volume, amount, timestamp = idx[valid], price[valid], volume[valid], amount[valid], timestamp[valid]
+
+        # a new day or a lower cumulative value restarts the increments from 0, the first tick of a code is a
+        # baseline unless the trades of the day so far all belong to the first bar
+        bar = self.bar_of(timestamp)
+        first = self.last_time[idx] == 0
+        reset = (timestamp // 1000000 != self.last_time[idx] // 1000000) | (volume < self.last_volume[idx])
+        reset = (reset & ~first) | (first & (bar % 1000 == 0))
+        delta_volume = np.where(reset, volume, np.where(first, 0., volume - self.last_volume[idx]))
+        delta_amount = np.where(reset, amount, np.where(first, 0., amount - self.last_amount[idx]))
+        delta_amount = np.where(np.isfinite(delta_amount), np.maximum(delta_amount, 0.), 0.)
+        self.last_time[idx] = timestamp
+        self.last_volume[idx] = volume
+        self.last_amount[idx] = np.where(np.isfinite(amount), amount, self.last_amount[idx])
+
+        roll = bar != self.bar[idx]
+        completed = self.emit(idx[roll & (self.bar[idx] >= 0)])
+
+        new = idx[roll]
+        self.bar[new] = bar[roll]
+        self.ohlc[new] = price[roll, np.newaxis]
+        self.volume[new] = delta_volume[roll]
+        self.amount[new] = delta_amount[roll]
+
+        same = idx[~roll]
+        self.ohlc[same, 1] = np.maximum(self.ohlc[same, 1], price[~roll])
+        self.ohlc[same, 2] = np.minimum(self.ohlc[same, 2], price[~roll])
+        self.ohlc[same, 3] = price[~roll]
+        self.volume[same] += delta_volume[~roll]
+        self.amount[same] += delta_amount[~roll]
+        return completed
+
+    def update_record(self, code: str, record: Series) -> DataFrame:
+        """
+        Consume the clean() output of one code.
+        """
+        return self.update(pd.DataFrame([record], index=[code]))
+
+    def flush(self) -> DataFrame:
+        """
+        Complete and return all the open bars, eg: at the end of the day.
+        """
+        idx = np.flatnonzero(self.bar[: len(self.codes)] >= 0)
+        completed = self.emit(idx)
+        self.bar[idx] = -1
+        return completed
@@ -0,0 +1,243 @@
+import time
+import json
+import asyncio
+import aiohttp
+import re
+
+from typing import List, Dict, Optional, Union
+from pandas import DataFrame, Series
+from rwad.data.collector.interface import DataCollector
+from rwad.metrics import Metrics
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        """
+        Token bucket rate limiter, shared by all coroutines requesting the same provider.
+        :param rate: tokens refilled per second, i.e. the sustained request rate
+        :param capacity: maximum tokens stored, i.e. the allowed burst size
+        """
+        assert rate > 0. and capacity > 0, "Rate and capacity should be positive."
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.timestamp = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.timestamp) * self.rate)
+            self.timestamp = now
+            if self.tokens >= 1.:
+                self.tokens -= 1.
+                return
+            await asyncio.sleep((1. - self.tokens) / self.rate)
+
+
+class AsyncDataCollector(DataCollector):
+    """
+    Asyncio version of DataCollector, all the requests share one pooled aiohttp client session.
+    Each provider has its own concurrency limit and token bucket, failed requests are retried with exponential
+    backoff. Batch methods never raise for a single code, the exception is returned as the result of that code.
+    Usage:
+        async with AsyncDataCollector() as collector:
+            df_dict = await collector.get_batch_historical_data(codes, '2021-01-01', '2021-12-31')
+    """
+    def __init__(self, provider: str = 'T', concurrency: int = 16, rate: float = 50., burst: int = 10,
+                 retries: int = 3, backoff: float = 0.5, timeout: float = 10., pool_size: int = 100,
+                 metrics: Metrics = None, base_urls: Dict = None):
+        """
+        :param provider: data provider of historical data: ['Tencent', 'Netease'], default: 'T' (for Tencent Stock)
+        :param concurrency: maximum concurrent requests per provider, default: 16
+        :param rate: maximum requests per second per provider, default: 50
+        :param burst: maximum requests sent at once when the bucket is full, default: 10
+        :param retries: retry times after a failed request, default: 3
+        :param backoff: delay before the first retry in seconds, doubled after each failure, default: 0.5
+        :param timeout: total timeout of one request in seconds, default: 10
+        :param pool_size: maximum connections kept in the pool, default: 100
+        :param metrics: hook receiving request and parse timings, default: None (for the no-op Metrics)
+        :param base_urls: endpoint hosts overriding BASE_URLS, eg: {"quote": "http://127.0.0.1:8000"}
+        """
+        super().__init__(provider, metrics, base_urls)
+        assert concurrency > 0 and retries >= 0 and backoff >= 0. and timeout > 0., "Illegal fetch parameters."
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = burst
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.client = None
+        self.semaphores = {}
+        self.limiters = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+
+    async def fetch(self, url: str, provider: str, endpoint: str) -> str:
+        """
+        Send a GET request under the concurrency and rate limits of the provider, retry on failure.
+        :param url: request url
+        :param provider: provider the url belongs to, used to select the limits: ['T', 'N', 'S']
+        :param endpoint: endpoint name reported to the metrics hook, eg: 'fqkline'
+        :return: response text
+        """
+        if self.client is None:
+            self.client = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.pool_size),
+                                                timeout=aiohttp.ClientTimeout(total=self.timeout))
+        if provider not in self.semaphores:
+            self.semaphores[provider] = asyncio.Semaphore(self.concurrency)
+            self.limiters[provider] = TokenBucket(self.rate, self.burst)
+
+        for attempt in range(self.retries + 1):
+            try:
+                async with self.semaphores[provider]:
+                    await self.limiters[provider].acquire()
+                    start = time.perf_counter()
+                    async with self.client.get(url) as response:
+                        response.raise_for_status()
+                        body = await response.read()
+                        text = body.decode(response.get_encoding(), errors='replace')
+                    if self.metrics.enabled:
+                        self.metrics.request(provider, endpoint, time.perf_counter() - start, len(body), attempt)
+                    return text
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt == self.retries:
+                    raise
+            await asyncio.sleep(self.backoff * 2 ** attempt)
+
+    async def get_historical_data(self, code: str, start_date: str, end_date: str,
+                                  freq: str = 'day') -> Optional[DataFrame]:
+        """
+        Return historical stock data, excluding the latest opening day.
+        :param code: stock code
+        :param start_date: data starts with this date, form: YYYY-mm-dd
+        :param end_date: data ends with this date, form: YYYY-mm-dd
+        :param freq: frequency: ['day', 'month'], default: 'day' (for day)
+        :return: a dataframe, including 6 basic stock factors (Date, Open, Close, High, Low, Volume)
+        """
+        code = code.lower()
+        assert len(code) == 8 and re.compile(r"(sh68|sh60|sh90|sh00\d{4})|(sz\d{6})").match(code) is not None, \
+            f"Stock Code {code} is illegal."
+        assert time.strptime(start_date, '%Y-%m-%d') or time.strptime(end_date, '%Y-%m-%d')
+        assert freq in ['day', 'month'], f"{freq} doesn't belong to ['day', 'month']"
+        assert self.provider in ['T', 'N'], f"{self.provider} is not in the provider list."
+
+        if self.provider == 'T':
+            url = f"{self.base_urls['fqkline']}/appstock/app/fqkline/get?"
+            days = int(time.mktime(time.strptime(end_date, '%Y-%m-%d'))
+                       - time.mktime(time.strptime(start_date, '%Y-%m-%d'))) // 86400
+            params = f"param={code},{freq},{start_date},{end_date},{days},qfq"
+            text = await self.fetch(f"{url}{params}", 'T', 'fqkline')
+            return self.timed('fqkline', self.load_kline, text, code, freq)
+
+        else:
+            assert freq == 'day', "Netease only supports freq: 'day'."
+            url = f"{self.base_urls['chddata']}/service/chddata.html?"
+            if re.compile(r"sh68|sh60|sh90|sh00\d{4}").match(code):
+                code = '0' + code[2:]
+            else:
+                code = '1' + code[2:]
+            params = f"code={code}&start={start_date.replace('-', '')}&end={end_date.replace('-', '')}" \
+                     f"&fields=TCLOSE;HIGH;LOW;TOPEN;LCLOSE;CHG;PCHG;VOTURNOVER"
+            text = await self.fetch(f"{url}{params}", 'N', 'chddata')
+            return self.timed('chddata', self.parse_netease_csv, text)
+
+    async def get_batch_historical_data(self, code_list: List, start_date: str, end_date: str,
+                                        freq: str = 'day') -> Dict:
+        """
+        Return a batch of historical trading data with the stock code in list.
+        :param code_list: stock code list
+        :param start_date: data starts with this date, form: YYYY-mm-dd
+        :param end_date: data ends with this date, form: YYYY-mm-dd
+        :param freq: frequency: ['day', 'month'], default: 'day' (for day)
+        :return: a dict of Dataframe, or the exception raised if the code failed
+        """
+        results = await asyncio.gather(*[self.get_historical_data(code, start_date, end_date, freq)
+                                         for code in code_list], return_exceptions=True)
+        return dict(zip(code_list, results))
+
+    async def get_real_time_data(self, code: str) -> Optional[Series]:
+        """
+        Return real time trading data with specific stock.
+        :param code: stock code, eg: SH600519, SZ399001
+        :return: latest stock data, None if the code doesn't exist
+        """
+        data = await self.get_batch_real_time_data([code])
+        if isinstance(data[code], Exception):
+            raise data[code]
+        return data[code]
+
+    async def get_batch_real_time_data(self, code_list: List, chunk_size: int = 60,
+                                       as_frame: bool = False) -> Union[Dict, DataFrame]:
+        """
+        Return a batch of real time trading data with the stock code in list, codes are packed into chunks and
+        the chunks are requested concurrently.
+        :param code_list: stock code list
+        :param chunk_size: number of stock codes packed into one request, default: 60
+        :param as_frame: return one dataframe indexed by stock code instead of a dict, default: False
+        :return: latest stock data dict, the value is None if the code doesn't exist or the exception raised if
+        the request of its chunk failed. If as_frame is True, failed codes are rows of NaN.
+        """
+        assert chunk_size > 0, f"chunk_size {chunk_size} should be positive."
+        url = f"{self.base_urls['quote']}/q="
+        for code in code_list:
+            code = code.lower()
+            assert len(code) == 8 and re.compile(r"(sh68|sh60|sh90\d{4})|(sz\d{6})").match(code) is not None, \
+                f"Stock Code {code} is illegal."
+
+        chunks = [code_list[i: i + chunk_size] for i in range(0, len(code_list), chunk_size)]
+        texts = await asyncio.gather(*[self.fetch(url + ','.join(f"{code.lower()},s_pk{code.lower()}"
+                                                                 for code in chunk), 'T', 'quote')
+                                       for chunk in chunks], return_exceptions=True)
+
+        if as_frame:
+            df = self.timed('quote', self.bulk_clean,
+                            ''.join(text for text in texts if not isinstance(text, Exception)))
+            df = df.reindex([code.lower() for code in code_list])
+            df.index = code_list
+            return df
+
+        data_dict = {}
+        for chunk, text in zip(chunks, texts):
+            if isinstance(text, Exception):
+                data_dict.update({code: text for code in chunk})
+                continue
+            records = self.split_records(text)
+            for code in chunk:
+                record = records.get(code.lower())
+                pk_record = records.get(f"s_pk{code.lower()}")
+                if record is not None and pk_record is not None:
+                    record = f"{record};{pk_record}"
+                data_dict[code] = self.timed('quote', self.clean, record)
+        return data_dict
+
+    async def get_minute_data(self, code: str) -> Optional[DataFrame]:
+        """
+        Get brief minute-level stock data of last opening day
+        :param code: stock code
+        :return: dataframe
+        """
+        code = code.lower()
+        assert len(code) == 8 and re.compile(r"(sh68|sh60|sh90|sh00\d{4})|(sz\d{6})").match(code) is not None, \
+            f"Stock Code {code} is illegal."
+        data = json.loads(await self.fetch(f"{self.base_urls['minute']}/appstock/app/minute/query?code={code}",
+                                           'T', 'minute'))
+        df = DataFrame(columns=["时间戳", "现价", "累计成交量", "现成交量"])
+        if data["code"] == -1:
+            return df
+        try:
+            data = data["data"][f"{code}"]["data"]["data"]
+        except KeyError:
+            return df
+        if data[0] == " 0":
+            return df
+        return self.parse_minute(data)
@@ -0,0 +1,277 @@
+import time
+import json
+import threading
+import numpy as np
+import requests
+import re
+
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Dict, Optional
+from pandas import DataFrame
+from rwad.data.collector.interface import BASE_URLS, Collector, DataCollector
+from rwad.metrics import Metrics
+
+
+class ProviderHealth:
+    """
+    Circuit breaker of one provider, shared by all the threads.
+    After threshold consecutive failures the circuit opens and the provider is skipped for cooldown seconds, then one
+    request is let through (half open): a success closes the circuit, a failure opens it again.
+    """
+    def __init__(self, threshold: int = 3, cooldown: float = 30.):
+        """
+        :param threshold: consecutive failures opening the circuit, default: 3
+        :param cooldown: seconds before a request is let through an open circuit, default: 30
+        """
+        assert threshold > 0 and cooldown >= 0., "Illegal circuit breaker parameters."
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.open_until = 0.
+        self.successes = 0
+        self.errors = 0
+        self.latency = None
+
+    def available(self) -> bool:
+        """
+        Read-only check: the circuit is closed or its cooldown is over, used to order the providers.
+        """
+        with self.lock:
+            return self.failures < self.threshold or time.monotonic() >= self.open_until
+
+    def claim(self) -> bool:
+        """
+        Check again right before a request is sent: an open circuit past its cooldown is half open and gives its single
+        probe to the first caller, the others are kept out until the probe returns or the cooldown is over again.
+        """
+        with self.lock:
+            now = time.monotonic()
+            if self.failures < self.threshold:
+                return True
+            if now >= self.open_until:
+                self.open_until = now + self.cooldown
+                return True
+            return False
+
+    def success(self, latency: float):
+        with self.lock:
+            self.failures = 0
+            self.successes += 1
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            self.errors += 1
+            if self.failures >= self.threshold:
+                self.open_until = time.monotonic() + self.cooldown
+
+
+class HedgedCollector(Collector):
+    """
+    Thread-safe historical data fetch hedged across providers (Tencent fqkline and Netease chddata).
+    The healthiest provider is requested first, the next one is requested as soon as a request fails or no answer
+    comes within hedge_delay, the first valid answer wins and the other requests are abandoned.
+    Nothing about a call is stored on the instance, so one collector can serve many threads at once.
+    Both providers are normalized to the schema of DataCollector.parse_kline() on unadjusted prices:
+    '日期' (str, YYYY-mm-dd, ascending), '开盘价', '收盘价', '最高价', '最低价' and '成交量（手）' (float64),
+    the provider of the answer is kept in df.attrs['provider'].
+    Usage:
+        collector = HedgedCollector()
+        df = collector.get_historical_data('sh600519', '2021-01-01', '2021-12-31')
+    """
+    columns = ["日期", "开盘价", "收盘价", "最高价", "最低价", "成交量（手）"]
+    endpoints = {'T': 'fqkline', 'N': 'chddata'}
+
+    def __init__(self, providers: List = None, hedge_delay: float = 0.5, timeout: float = 10., workers: int = 16,
+                 threshold: int = 3, cooldown: float = 30., metrics: Metrics = None, base_urls: Dict = None):
+        """
+        :param providers: providers in order of preference: ['Tencent', 'Netease'], default: ['T', 'N']
+        :param hedge_delay: seconds to wait for an answer before requesting the next provider, default: 0.5
+        :param timeout: timeout of one request in seconds, default: 10
+        :param workers: threads sending requests, default: 16
+        :param threshold: consecutive failures opening the circuit of a provider, default: 3
+        :param cooldown: seconds an open circuit skips its provider, default: 30
+        :param metrics: hook receiving request and parse timings, default: None (for the no-op Metrics)
+        :param base_urls: endpoint hosts overriding BASE_URLS, eg: {"fqkline": "http://127.0.0.1:8000"}
+        """
+        providers = ['T', 'N'] if providers is None else providers
+        for provider in providers:
+            assert provider in ['T', 'N'], f"{provider} is not in the provider list."
+        assert hedge_delay >= 0. and timeout > 0. and workers > 0, "Illegal fetch parameters."
+        self.providers = providers
+        self.hedge_delay = hedge_delay
+        self.timeout = timeout
+        self.health = {provider: ProviderHealth(threshold, cooldown) for provider in providers}
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        # requests of all the calls in progress, cancelled by close()
+        self.inflight = set()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.base_urls = {**BASE_URLS, **(base_urls or {})}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.pool.shutdown(wait=False)
+        with self.lock:
+            for future in self.inflight:
+                future.cancel()
+
+    @property
+    def session(self) -> requests.Session:
+        # requests sessions are not thread-safe, each thread keeps its own connection pool
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def request_url(self, provider: str, code: str, start_date: str, end_date: str, freq: str) -> str:
+        if provider == 'T':
+            days = int(time.mktime(time.strptime(end_date, '%Y-%m-%d'))
+                       - time.mktime(time.strptime(start_date, '%Y-%m-%d'))) // 86400
+            return f"{self.base_urls['fqkline']}/appstock/app/fqkline/get?" \
+                   f"param={code},{freq},{start_date},{end_date},{days},"
+        if re.compile(r"sh68|sh60|sh90|sh00\d{4}").match(code):
+            code = '0' + code[2:]
+        else:
+            code = '1' + code[2:]
+        return f"{self.base_urls['chddata']}/service/chddata.html?" \
+               f"code={code}&start={start_date.replace('-', '')}&end={end_date.replace('-', '')}" \
+               f"&fields=TCLOSE;HIGH;LOW;TOPEN;LCLOSE;CHG;PCHG;VOTURNOVER"
+
+    def normalize(self, provider: str, code: str, freq: str, content: bytes) -> DataFrame:
+        """
+        Parse a raw answer to the common schema, raise ValueError if the answer is not valid.
+        """
+        if provider == 'T':
+            try:
+                data = json.loads(content)["data"][code]
+            except (ValueError, KeyError, TypeError):
+                raise ValueError(f"Illegal Tencent answer of {code}.")
+            # forward adjusted bars (qfq{freq}) don't match the unadjusted prices of Netease, they are not valid
+            data = data.get(freq) if isinstance(data, dict) else None
+            if data is None:
+                raise ValueError(f"No unadjusted Tencent bars of {code}.")
+            df = DataCollector.parse_kline(data)
+        else:
+            df = DataCollector.parse_netease_csv(content.decode('gbk', errors='replace'))
+            if not set(["日期", "开盘价", "收盘价", "最高价", "最低价", "成交量"]).issubset(df.columns):
+                raise ValueError(f"Illegal Netease answer of {code}.")
+            # Netease answers in descending date order with volume in shares
+            df = df.rename(columns={"成交量": "成交量（手）"})
+            df["成交量（手）"] = df["成交量（手）"] / 100.
+            df = df[self.columns].sort_values("日期", kind='stable').reset_index(drop=True)
+        df[self.columns[1:]] = df[self.columns[1:]].astype(np.float64)
+        df.attrs["provider"] = provider
+        return df
+
+    def fetch(self, provider: str, code: str, start_date: str, end_date: str, freq: str,
+              abandoned: threading.Event) -> Optional[DataFrame]:
+        """
+        :return: normalized answer of one provider, None if abandoned, provider health is updated
+        """
+        start = time.perf_counter()
+        try:
+            with self.session.get(self.request_url(provider, code, start_date, end_date, freq),
+                                  timeout=self.timeout, stream=True) as response:
+                if abandoned.is_set():
+                    return None
+                response.raise_for_status()
+                content = response.content
+                if self.metrics.enabled:
+                    parsed = time.perf_counter()
+                    self.metrics.request(provider, self.endpoints[provider], parsed - start, len(content))
+                df = self.normalize(provider, code, freq, content)
+                if self.metrics.enabled:
+                    self.metrics.parse(provider, self.endpoints[provider], time.perf_counter() - parsed)
+        except Exception:
+            if not abandoned.is_set():
+                self.health[provider].failure()
+            raise
+        self.health[provider].success(time.perf_counter() - start)
+        return df
+
+    def route(self, freq: str) -> List:
+        """
+        Providers supporting freq with a closed circuit, the fastest first; all of them if every circuit is open.
+        """
+        candidates = [provider for provider in self.providers if freq == 'day' or provider == 'T']
+        assert len(candidates) > 0, f"No provider supports freq: '{freq}'."
+        routed = [provider for provider in candidates if self.health[provider].available()]
+        if len(routed) == 0:
+            return candidates
+        order = {provider: i for i, provider in enumerate(self.providers)}
+        return sorted(routed, key=lambda p: (self.health[p].latency is None, self.health[p].latency or 0., order[p]))
+
+    def get_historical_data(self, code: str, start_date: str, end_date: str, freq: str = 'day') -> Optional[DataFrame]:
+        """
+        Return historical stock data from the first provider giving a valid answer.
+        :param code: stock code
+        :param start_date: data starts with this date, form: YYYY-mm-dd
+        :param end_date: data ends with this date, form: YYYY-mm-dd
+        :param freq: frequency: ['day', 'month'], default: 'day' (for day), 'month' is only supported by Tencent
+        :return: a dataframe of the common schema, None if every provider failed
+        """
+        code = code.lower()
+        assert len(code) == 8 and re.compile(r"(sh68|sh60|sh90|sh00\d{4})|(sz\d{6})").match(code) is not None, \
+            f"Stock Code {code} is illegal."
+        assert time.strptime(start_date, '%Y-%m-%d') or time.strptime(end_date, '%Y-%m-%d')
+        assert freq in ['day', 'month'], f"{freq} doesn't belong to ['day', 'month']"
+
+        queue = self.route(freq)
+        # route() gives the open circuits too when every circuit is open, they are requested without a probe
+        forced = not any(self.health[provider].available() for provider in queue)
+        abandoned = threading.Event()
+        futures = []
+        pending = set()
+        empty = None
+        try:
+            while queue or pending:
+                if queue:
+                    provider = queue.pop(0)
+                    # the probe of a half open circuit is only claimed by the provider actually requested
+                    if not self.health[provider].claim() and not forced:
+                        continue
+                    future = self.pool.submit(self.fetch, provider, code, start_date, end_date, freq, abandoned)
+                    with self.lock:
+                        self.inflight.add(future)
+                    futures.append(future)
+                    pending.add(future)
+                done, pending = wait(pending, timeout=self.hedge_delay if queue else None,
+                                     return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is not None:
+                        continue
+                    df = future.result()
+                    if len(df) > 0:
+                        return df
+                    # an empty answer may be a range without trading day, keep it unless another provider has data
+                    empty = df
+            return empty
+        finally:
+            abandoned.set()
+            with self.lock:
+                for future in futures:
+                    future.cancel()
+                    self.inflight.discard(future)
+
+    def get_batch_historical_data(self, code_list: List, start_date: str, end_date: str, freq: str = 'day') -> Dict:
+        """
+        Return a batch of historical trading data with the stock code in list, each code is hedged independently.
+        :return: a dict of Dataframe, None for the codes every provider failed
+        """
+        with ThreadPoolExecutor(max_workers=min(32, max(1, len(code_list)))) as pool:
+            results = pool.map(lambda code: self.get_historical_data(code, start_date, end_date, freq), code_list)
+            return dict(zip(code_list, results))
+
+    def get_real_time_data(self, code: str):
+        raise NotImplementedError("Use DataCollector for real time data.")
+
+    def clean(self, record: List):
+        raise NotImplementedError("Use DataCollector for real time data.")
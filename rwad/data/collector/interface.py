@@ -15,14 +15,25 @@ copies or substantial portions of the Software.
 
 """
 import time
+import datetime
 import json
+import numpy as np
 import pandas as pd
-import grequests
 import requests
 import re
 
-from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from operator import itemgetter
+from typing import Iterator, List, Dict, Optional, Tuple, Union
 from pandas import DataFrame, Series
+from rwad.metrics import Metrics
+
+# hosts of the provider endpoints, override them (eg: with a local server replaying recorded responses) by the
+# base_urls parameter of DataCollector
+BASE_URLS = {"fqkline": "https://web.ifzq.gtimg.cn", "minute": "https://web.ifzq.gtimg.cn",
+             "quote": "https://qt.gtimg.cn", "chddata": "https://quotes.money.163.com",
+             "pricehis": "https://market.finance.sina.com.cn"}
 
 
 class Collector:
@@ -43,17 +54,27 @@ class DataCollector(Collector):
     Now, it already collects data from Tencent, Sina, Netease and Hexun.
     Returned data differs from providers, users need to distinguish by themselves.
     """
-    def __init__(self, provider: str = 'T'):
+    # threads sending the requests of a batch
+    workers = 16
+
+    def __init__(self, provider: str = 'T', metrics: Metrics = None, base_urls: Dict = None):
         """
         This init function is to indicate a data provider.
         :param provider: data provider: ['Tencent', 'Netease', 'Sina'], default: 'T' (for Tencent Stock)
+        :param metrics: hook receiving request and parse timings, default: None (for the no-op Metrics)
+        :param base_urls: endpoint hosts overriding BASE_URLS, eg: {"quote": "http://127.0.0.1:8000"}
         """
         assert provider in ['T', 'N', 'S'], f"{provider} is not in the provider list."
         self.provider = provider
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.base_urls = {**BASE_URLS, **(base_urls or {})}
         self.url = None
         self.requests = None
-        self.grequests = None
         self.session = requests.Session()
+        # batch requests share the session from a thread pool, keep a connection per thread
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
         self.raw_columns = ["交易所x", "股票名称x", "股票代码x", "现价", "昨收", "今开", "成交量", "外盘", "内盘",
                             "买一", "买一量", "买二", "买二量", "买三", "买三量", "买四", "买四量", "买五", "买五量",
                             "卖一", "卖一量", "卖二", "卖二量", "卖三", "卖三量", "卖四", "卖四量", "卖五", "卖五量",
@@ -62,6 +83,8 @@ class DataCollector(Collector):
                             "LF市盈率", "涨停价", "跌停价", "量比", "A", "均价", "动态市盈率", "静态市盈率", "B", "成交额",
                             "nonex", "nonex", "nonex", "GP-Ax", "C", "D", "E", "F", "G", "H", "I", "J", "K", "L", "x",
                             "x", "M", "N", "x", "买盘大单", "买盘小单", "卖盘大单", "卖盘小单"]
+        self.int_columns = ["成交量", "外盘", "内盘", "买一量", "买二量", "买三量", "买四量", "买五量",
+                            "卖一量", "卖二量", "卖三量", "卖四量", "卖五量", "时间戳"]
 
     def get_historical_data(self, code: str, start_date: str, end_date: str, freq: str = 'day') -> Optional[DataFrame]:
         """
@@ -79,30 +102,17 @@ class DataCollector(Collector):
         assert freq in ['day', 'month'], f"{freq} doesn't belong to ['day', 'month']"
         assert self.provider in ['T', 'N', 'S'], f"{self.provider} is not in the provider list."
 
-        columns = ["日期", "开盘价", "收盘价", "最高价", "最低价", "成交量（手）"]
-        clean_data = []
-
         if self.provider == 'T':
-            self.url = "https://web.ifzq.gtimg.cn/appstock/app/fqkline/get?"
+            self.url = f"{self.base_urls['fqkline']}/appstock/app/fqkline/get?"
             days = int(time.mktime(time.strptime(end_date, '%Y-%m-%d'))
                        - time.mktime(time.strptime(start_date, '%Y-%m-%d'))) // 86400
             params = f"param={code},{freq},{start_date},{end_date},{days},qfq"
-            self.requests = self.session.get(f"{self.url}{params}")
-            data = json.loads(self.requests.text)
-            try:
-                data = data["data"][code][f"qfq{freq}"]
-            except KeyError:
-                data = data["data"][code][f"{freq}"]
-
-            for _data in data:
-                if len(_data) > 6:
-                    _data = _data[: 6]
-                clean_data.append(_data)
-            return pd.DataFrame(clean_data, columns=columns)
+            self.requests = self.get(f"{self.url}{params}", 'fqkline')
+            return self.timed('fqkline', self.load_kline, self.requests.text, code, freq)
 
         else:
             assert freq == 'day', f"Netease only supports freq: 'day'."
-            self.url = "https://quotes.money.163.com/service/chddata.html?"
+            self.url = f"{self.base_urls['chddata']}/service/chddata.html?"
             start_date = start_date.replace('-', '')
             end_date = end_date.replace('-', '')
             if re.compile(r"sh68|sh60|sh90|sh00\d{4}").match(code):
@@ -111,16 +121,8 @@ class DataCollector(Collector):
                 code = '1' + code[2:]
             params = f'code={code}&start={start_date}&end={end_date}' \
                      f'&fields=TCLOSE;HIGH;LOW;TOPEN;LCLOSE;CHG;PCHG;VOTURNOVER'
-            self.requests = self.session.get(f"{self.url}{params}")
-            raw_data = self.requests.text.split('\r\n')
-            columns = raw_data[0].split(',')
-            raw_data = raw_data[1: -1]
-            df = pd.DataFrame(columns=columns)
-
-            for line in raw_data:
-                record = line.split(',')
-                df = df.append(pd.Series(record, index=columns), ignore_index=True)
-            return df
+            self.requests = self.get(f"{self.url}{params}", 'chddata')
+            return self.timed('chddata', self.parse_netease_csv, self.requests.text)
 
     def get_batch_historical_data(self, code_list: List, start_date: str, end_date: str, freq: str = 'day') -> Dict:
         """
@@ -136,10 +138,9 @@ class DataCollector(Collector):
         assert self.provider in ['T', 'N', 'S'], f"{self.provider} is not in the provider list."
 
         if self.provider == 'T':
-            self.url = "https://web.ifzq.gtimg.cn/appstock/app/fqkline/get?"
+            self.url = f"{self.base_urls['fqkline']}/appstock/app/fqkline/get?"
             df_dict = {}
-            request_list = []
-            columns = ["日期", "开盘价", "收盘价", "最高价", "最低价", "成交量（手）"]
+            urls = []
 
             for code in code_list:
                 code = code.lower()
@@ -148,30 +149,20 @@ class DataCollector(Collector):
                 days = int(time.mktime(time.strptime(end_date, '%Y-%m-%d'))
                            - time.mktime(time.strptime(start_date, '%Y-%m-%d'))) // 86400
                 params = f"param={code},{freq},{start_date},{end_date},{days},qfq"
-                request_list.append(grequests.get(f"{self.url}{params}", session=self.session))
-            self.requests = grequests.map(request_list)
+                urls.append(f"{self.url}{params}")
+            self.requests = self.get_batch(urls, 'fqkline')
 
             for req, code in zip(self.requests, code_list):
-                clean_data = []
-                try:
-                    data = json.loads(req.text)["data"][code.lower()][f"qfq{freq}"]
-                except KeyError:
-                    data = json.loads(req.text)["data"][code.lower()][f"{freq}"]
-
-                for _data in data:
-                    if len(_data) > 6:
-                        _data = _data[: 6]
-                    clean_data.append(_data)
-                df_dict[code] = pd.DataFrame(clean_data, columns=columns)
+                df_dict[code] = self.timed('fqkline', self.load_kline, req.text, code.lower(), freq)
             return df_dict
 
         else:
             assert freq == 'day', f"Netease only supports freq: 'day'."
-            self.url = "https://quotes.money.163.com/service/chddata.html?"
+            self.url = f"{self.base_urls['chddata']}/service/chddata.html?"
             start_date = start_date.replace('-', '')
             end_date = end_date.replace('-', '')
             df_dict = {}
-            request_list = []
+            urls = []
 
             for code in code_list:
                 code = code.lower()
@@ -183,20 +174,12 @@ class DataCollector(Collector):
                     code = '1' + code[2:]
                 params = f'code={code}&start={start_date}&end={end_date}' \
                          f'&fields=TCLOSE;HIGH;LOW;TOPEN;LCLOSE;CHG;PCHG;VOTURNOVER'
-                request_list.append(grequests.get(f"{self.url}{params}", session=self.session))
+                urls.append(f"{self.url}{params}")
                 print(f"{self.url}{params}")
-            self.requests = grequests.map(request_list)
+            self.requests = self.get_batch(urls, 'chddata')
 
             for req, code in zip(self.requests, code_list):
-                raw_data = req.text.split('\r\n')
-                columns = raw_data[0].split(',')
-                raw_data = raw_data[1: -1]
-                df = pd.DataFrame(columns=columns)
-
-                for line in raw_data:
-                    record = line.split(',')
-                    df = df.append(pd.Series(record, index=columns), ignore_index=True)
-                df_dict[code] = df
+                df_dict[code] = self.timed('chddata', self.parse_netease_csv, req.text)
             return df_dict
 
     def get_real_time_data(self, code: str) -> Optional[Series]:
@@ -212,33 +195,199 @@ class DataCollector(Collector):
         assert len(code) == 8 and re.compile(r"(sh68|sh60|sh90\d{4})|(sz\d{6})").match(code) is not None, \
             f"Stock Code {code} is illegal."
 
-        self.url = "https://qt.gtimg.cn/q="
-        self.requests = self.session.get(f"{self.url}{code},s_pk{code}")
-        return self.clean(self.requests.text[: -2]) if 'v_pv_none_match' not in self.requests.text else None
+        self.url = f"{self.base_urls['quote']}/q="
+        self.requests = self.get(f"{self.url}{code},s_pk{code}", 'quote')
+        if 'v_pv_none_match' in self.requests.text:
+            return None
+        return self.timed('quote', self.clean, self.requests.text[: -2])
 
-    def get_batch_real_time_data(self, code_list: List) -> Optional[Dict]:
+    def get_batch_real_time_data(self, code_list: List, chunk_size: int = 1,
+                                 as_frame: bool = False) -> Optional[Union[Dict, DataFrame]]:
         """
         Return a batch of real time trading data with the stock code in list.
+        Tencent accepts a comma-separated code list in one query, so codes are packed into chunks of
+        chunk_size and each chunk costs only one http request.
         :param code_list: stock code list
-        :return: latest stock data dict
+        :param chunk_size: number of stock codes packed into one request, default: 1 (one request per code)
+        :param as_frame: return one dataframe indexed by stock code instead of a dict, default: False
+        :return: latest stock data dict, or a dataframe if as_frame is True
         """
         assert self.provider == 'T', "Only Tencent Stock interface is supported!"
+        assert chunk_size > 0, f"chunk_size {chunk_size} should be positive."
 
-        self.url = "https://qt.gtimg.cn/q="
-        request_list = []
+        self.url = f"{self.base_urls['quote']}/q="
+        urls = []
         data_dict = {}
 
         for code in code_list:
             code = code.lower()
             assert len(code) == 8 and re.compile(r"(sh68|sh60|sh90\d{4})|(sz\d{6})").match(code) is not None, \
                 f"Stock Code {code} is illegal."
-            request_list.append(grequests.get(f"{self.url}{code},s_pk{code}", session=self.session))
-        self.requests = grequests.map(request_list)
+        for i in range(0, len(code_list), chunk_size):
+            params = ','.join(f"{code.lower()},s_pk{code.lower()}" for code in code_list[i: i + chunk_size])
+            urls.append(f"{self.url}{params}")
+        self.requests = self.get_batch(urls, 'quote')
+
+        if as_frame:
+            df = self.timed('quote', self.bulk_clean, ''.join(req.text for req in self.requests))
+            df = df.reindex([code.lower() for code in code_list])
+            df.index = code_list
+            return df
 
-        for code, req in zip(code_list, self.requests):
-            data_dict[code] = self.clean(req.text[: -2]) if "v_pv_none_match" not in req.text else None
+        records = {}
+        for req in self.requests:
+            records.update(self.split_records(req.text))
+        for code in code_list:
+            record = records.get(code.lower())
+            if record is None:
+                data_dict[code] = None
+                continue
+            pk_record = records.get(f"s_pk{code.lower()}")
+            if pk_record is not None:
+                record = f"{record};{pk_record}"
+            data_dict[code] = self.timed('quote', self.clean, record)
         return data_dict
 
+    def get(self, url: str, endpoint: str) -> requests.Response:
+        """
+        Send a GET request with the session, latency and size are reported to the metrics hook.
+        """
+        if not self.metrics.enabled:
+            return self.session.get(url)
+        start = time.perf_counter()
+        response = self.session.get(url)
+        self.metrics.request(self.provider, endpoint, time.perf_counter() - start, len(response.content))
+        return response
+
+    def get_batch(self, urls: List, endpoint: str, workers: int = None) -> List[Optional[requests.Response]]:
+        """
+        Send GET requests concurrently from a thread pool over the session, unlike grequests the process is not
+        monkey-patched by gevent, so it can run next to asyncio.
+        :param workers: maximum concurrent requests, default: None (for DataCollector.workers)
+        :return: responses in the order of urls, None for a request failed to connect
+        """
+        def get(url: str) -> Optional[requests.Response]:
+            try:
+                return self.get(url, endpoint)
+            except requests.RequestException:
+                return None
+
+        if len(urls) == 0:
+            return []
+        with ThreadPoolExecutor(max_workers=min(workers or self.workers, len(urls))) as pool:
+            return list(pool.map(get, urls))
+
+    def timed(self, endpoint: str, func, *args):
+        """
+        Call a parser, its duration is reported to the metrics hook.
+        """
+        if not self.metrics.enabled:
+            return func(*args)
+        start = time.perf_counter()
+        result = func(*args)
+        self.metrics.parse(self.provider, endpoint, time.perf_counter() - start)
+        return result
+
+    @staticmethod
+    def load_kline(text: str, code: str, freq: str) -> DataFrame:
+        """
+        Parse a Tencent fqkline response, forward adjusted records are preferred.
+        """
+        data = json.loads(text)
+        try:
+            data = data["data"][code][f"qfq{freq}"]
+        except KeyError:
+            data = data["data"][code][f"{freq}"]
+        return DataCollector.parse_kline(data)
+
+    @staticmethod
+    def parse_kline(data: List) -> DataFrame:
+        """
+        Transfer Tencent kline records to a dataframe, the extra fields after volume are dropped.
+        :param data: kline records, eg: [["2021-01-04", "1800.00", "1810.00", "1820.00", "1790.00", "12345.00"], ...]
+        :return: a dataframe, including 6 basic stock factors, prices and volume in float64
+        """
+        columns = ["日期", "开盘价", "收盘价", "最高价", "最低价", "成交量（手）"]
+        df = pd.DataFrame([record[: 6] for record in data], columns=columns)
+        df[columns[1:]] = df[columns[1:]].apply(pd.to_numeric, errors='coerce').astype(np.float64)
+        return df
+
+    @staticmethod
+    def parse_netease_csv(text: str) -> DataFrame:
+        """
+        Transfer the csv text returned by Netease to a dataframe in one pass.
+        :param text: raw csv text, the first line is the header
+        :return: a dataframe, '日期', '股票代码' and '名称' are kept as strings, others are float64
+        """
+        df = pd.read_csv(StringIO(text), dtype=str)
+        numeric = [column for column in df.columns if column not in ["日期", "股票代码", "名称"]]
+        df[numeric] = df[numeric].apply(pd.to_numeric, errors='coerce').astype(np.float64)
+        return df
+
+    @staticmethod
+    def parse_minute(data: List) -> DataFrame:
+        """
+        Split Tencent minute records into columns in bulk.
+        :param data: minute records, eg: ["0930 1800.00 1234 1234", ...]
+        :return: a dataframe, '时间戳' is kept as string (HHMM), '现价' is float64 and volumes are int64
+        """
+        columns = ["时间戳", "现价", "累计成交量", "现成交量"]
+        df = pd.read_csv(StringIO('\n'.join(data)), sep=' ', header=None, usecols=range(4), names=columns,
+                         dtype={"时间戳": str, "现价": np.float64, "累计成交量": np.float64, "现成交量": np.float64})
+        df[columns[2:]] = df[columns[2:]].fillna(0).astype(np.int64)
+        return df
+
+    @staticmethod
+    def iter_transaction_detail(text: str) -> Iterator[Tuple[float, int, float]]:
+        """
+        Stream the price-volume distribution out of the html page of Sina, cell by cell.
+        :param text: raw html text
+        :return: iterator of (price, volume in shares, percentage) rows
+        """
+        cells = (match.group(1) for match in re.finditer(r'>([0-9][^<]*)<', text))
+        for price, volume, share in zip(cells, cells, cells):
+            yield float(price.replace(',', '')), int(volume.replace(',', '')), float(share.rstrip('%'))
+
+    @staticmethod
+    def parse_transaction_detail(text: str) -> DataFrame:
+        """
+        Extract the price-volume distribution from the html page of Sina.
+        :param text: raw html text
+        :return: a dataframe with price (float64), volume (int64) and percentage (float64)
+        """
+        columns = ["成交价（元）", "成交量（股）", "占比"]
+        rows = list(DataCollector.iter_transaction_detail(text))
+        return pd.DataFrame({
+            columns[0]: np.array([row[0] for row in rows], dtype=np.float64),
+            columns[1]: np.array([row[1] for row in rows], dtype=np.int64),
+            columns[2]: np.array([row[2] for row in rows], dtype=np.float64),
+        }, columns=columns)
+
+    @staticmethod
+    def split_date_range(start_date: str, end_date: str, days: int) -> List[Tuple[str, str]]:
+        """
+        Split a date range into consecutive windows of at most days days.
+        :return: list of (start date, end date) of each window, both inclusive, form: YYYY-mm-dd
+        """
+        start = datetime.datetime.strptime(start_date, '%Y-%m-%d')
+        end = datetime.datetime.strptime(end_date, '%Y-%m-%d')
+        windows = []
+        while start <= end:
+            stop = min(start + datetime.timedelta(days=days - 1), end)
+            windows.append((start.strftime('%Y-%m-%d'), stop.strftime('%Y-%m-%d')))
+            start = stop + datetime.timedelta(days=1)
+        return windows
+
+    @staticmethod
+    def split_records(text: str) -> Dict:
+        """
+        Split a multi-code Tencent quote response into single records.
+        :param text: raw response text, eg: 'v_sh600519="...";v_s_pksh600519="...";'
+        :return: a dict mapping the variable name without 'v_' (eg: 'sh600519', 's_pksh600519') to its record
+        """
+        return {match.group(1): match.group(0) for match in re.finditer(r'v_(\w+)="[^"]*"', text)
+                if match.group(1) != 'pv_none_match'}
+
     def get_minute_data(self, code) -> Optional[DataFrame]:
         """
         Get brief minute-level stock data of last opening day
@@ -249,8 +398,9 @@ class DataCollector(Collector):
         code = code.lower()
         assert len(code) == 8 and re.compile(r"(sh68|sh60|sh90|sh00\d{4})|(sz\d{6})").match(code) is not None, \
             f"Stock Code {code} is illegal."
-        self.url = f"https://web.ifzq.gtimg.cn/appstock/app/minute/query?code={code}"
-        self.requests = self.session.get(self.url)
+        self.url = f"{self.base_urls['minute']}/appstock/app/minute/query?code={code}"
+        self.requests = self.get(self.url, 'minute')
+        start = time.perf_counter() if self.metrics.enabled else 0.
         data = json.loads(self.requests.text)
         columns = ["时间戳", "现价", "累计成交量", "现成交量"]
         df = pd.DataFrame(columns=columns)
@@ -262,35 +412,62 @@ class DataCollector(Collector):
             return df
         if data[0] == " 0":
             return df
-        else:
-            for record in data:
-                record = record.split(' ')
-                df = df.append(pd.Series(record, index=columns), ignore_index=True)
+        df = self.parse_minute(data)
+        if self.metrics.enabled:
+            self.metrics.parse(self.provider, 'minute', time.perf_counter() - start)
         return df
 
-    def get_transaction_detail(self, code: str, start_date: str, end_date: str) -> Optional[DataFrame]:
+    def get_transaction_detail(self, code: str, start_date: str, end_date: str, split: bool = False,
+                               window: int = 250, workers: int = 8) -> Optional[DataFrame]:
+        """
+        Return the price-volume distribution of a stock over a date range.
+        :param code: stock code
+        :param start_date: distribution starts with this date, form: YYYY-mm-dd
+        :param end_date: distribution ends with this date, form: YYYY-mm-dd
+        :param split: split the range into windows fetched concurrently, so ranges longer than the 270 days
+        accepted by Sina are allowed, default: False
+        :param window: days per window when split, should be less than 270, default: 250
+        :param workers: maximum concurrent requests when split, default: 8
+        :return: a dataframe with price (float64), volume (int64) and percentage (float64); when split, the windows
+        are merged by price, sorted by price and the percentage is recomputed over the whole range
+        """
         assert self.provider == 'S', "Only Sina Stock interface is supported!"
         code = code.lower()
         assert len(code) == 8 and re.compile(r"(sh68|sh60|sh90|sh00\d{4})|(sz\d{6})").match(code) is not None, \
             f"Stock Code {code} is illegal."
         assert time.strptime(start_date, '%Y-%m-%d') or time.strptime(end_date, '%Y-%m-%d')
-        days = int(time.mktime(time.strptime(end_date, '%Y-%m-%d'))
-                   - time.mktime(time.strptime(start_date, '%Y-%m-%d'))) // 86400
-        assert days < 270, "Query date range is too large, please narrow the scope with 10 months."
-
-        self.url = "https://market.finance.sina.com.cn/pricehis.php?"
-        params = f"symbol={code}&startdate={start_date}&enddate={end_date}"
-        self.requests = self.session.get(f"{self.url}{params}")
-        data = re.findall(r'>[0-9].*<', self.requests.text)
-        columns = ["成交价（元）", "成交量（股）", "占比"]
-        df = pd.DataFrame(columns=columns)
+        self.url = f"{self.base_urls['pricehis']}/pricehis.php?"
 
-        for element in range(0, len(data), 3):
-            val_1 = float(data[element][1: -1].replace(',', ''))
-            val_2 = int(data[element + 1][1: -1])
-            val_3 = float(data[element + 2][1: -2])
-            df = df.append(pd.Series([val_1, val_2, val_3], index=columns), ignore_index=True)
-        return df
+        if not split:
+            days = int(time.mktime(time.strptime(end_date, '%Y-%m-%d'))
+                       - time.mktime(time.strptime(start_date, '%Y-%m-%d'))) // 86400
+            assert days < 270, "Query date range is too large, please narrow the scope with 10 months."
+            params = f"symbol={code}&startdate={start_date}&enddate={end_date}"
+            self.requests = self.get(f"{self.url}{params}", 'pricehis')
+            return self.timed('pricehis', self.parse_transaction_detail, self.requests.text)
+
+        assert 0 < window < 270, f"Window {window} should be in (0, 270) days."
+        assert workers > 0, f"workers {workers} should be positive."
+        windows = self.split_date_range(start_date, end_date, window)
+        self.requests = self.get_batch([f"{self.url}symbol={code}&startdate={start}&enddate={end}"
+                                        for start, end in windows], 'pricehis', workers)
+
+        prices = []
+        volumes = []
+        for req, (start, end) in zip(self.requests, windows):
+            if req is None or not req.ok:
+                raise ConnectionError(f"Failed to get the transaction detail of {code} from {start} to {end}.")
+            for price, volume, _ in self.iter_transaction_detail(req.text):
+                prices.append(price)
+                volumes.append(volume)
+
+        columns = ["成交价（元）", "成交量（股）", "占比"]
+        df = pd.DataFrame({columns[0]: np.array(prices, dtype=np.float64),
+                           columns[1]: np.array(volumes, dtype=np.int64)})
+        df = df.groupby(columns[0], sort=True, as_index=False)[columns[1]].sum()
+        total = df[columns[1]].sum()
+        df[columns[2]] = df[columns[1]] / total * 100. if total > 0 else 0.
+        return df[columns]
 
     def clean(self, record: str) -> Optional[Series]:
         """
@@ -314,3 +491,39 @@ class DataCollector(Collector):
                 index.append(key)
                 series.append(eval(val))
         return pd.Series(series, index=index)
+
+    def bulk_clean(self, text: str) -> DataFrame:
+        """
+        Vectorized version of clean(), transfer a raw response of many stocks to one typed dataframe in a single
+        pass. Volume and timestamp factors are int64 (missing values are filled with 0), others are float64.
+        :param text: raw response text of get_batch_real_time_data(), may contain any number of stocks
+        :return: dataframe indexed by lower-case stock code, with the same 62 factors as clean()
+        """
+        records = self.split_records(text)
+        fields = [i for i, key in enumerate(self.raw_columns) if 'x' not in key]
+        columns = [self.raw_columns[i] for i in fields]
+        picker = itemgetter(*fields)
+        width = len(self.raw_columns)
+        codes = []
+        rows = []
+
+        for code, record in records.items():
+            if code.startswith('s_pk'):
+                continue
+            raw_data = record[record.index('"') + 1: -1]
+            pk_record = records.get(f"s_pk{code}")
+            if pk_record is not None:
+                raw_data += pk_record[pk_record.index('"') + 1: -1]
+            data_list = raw_data.replace("~~~", '~').replace("~~", '~').replace("~ ", '~').split('~')
+            if len(data_list) < width:
+                data_list += [''] * (width - len(data_list))
+            codes.append(code)
+            rows.append(picker(data_list))
+
+        df = pd.read_csv(StringIO('\n'.join(map(','.join, rows))), header=None, names=columns)
+        df.index = codes
+        if len(df.select_dtypes(exclude='number').columns) > 0:
+            df = df.apply(pd.to_numeric, errors='coerce')
+        df = df.astype(np.float64)
+        df[self.int_columns] = df[self.int_columns].fillna(0).astype(np.int64)
+        return df
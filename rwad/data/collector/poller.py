@@ -0,0 +1,235 @@
+import time
+import asyncio
+import threading
+import numpy as np
+import pandas as pd
+
+from collections import deque
+from typing import List
+from pandas import DataFrame
+from rwad.data.collector.interface import DataCollector
+
+
+class RingBuffer:
+    def __init__(self, size: int, policy: str = 'coalesce'):
+        """
+        Bounded buffer of quote deltas between the poller and its consumer.
+        :param size: maximum deltas buffered
+        :param policy: what to do when the buffer is full: ['coalesce', 'drop_oldest', 'block'], default: 'coalesce'.
+        'coalesce' merges the new delta into the newest buffered one so only the latest quote of each code is kept,
+        'drop_oldest' discards the oldest delta, 'block' makes the poller wait and skip the missed polls.
+        """
+        assert size > 0, f"Buffer size {size} should be positive."
+        assert policy in ['coalesce', 'drop_oldest', 'block'], f"{policy} is not a backpressure policy."
+        self.size = size
+        self.policy = policy
+        self.deltas = deque()
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self.deltas)
+
+    def full(self) -> bool:
+        return len(self.deltas) >= self.size
+
+    def put(self, delta: DataFrame):
+        """
+        Put a delta, the caller should wait until the buffer is not full first under the 'block' policy.
+        """
+        if self.full():
+            if self.policy == 'coalesce':
+                merged = pd.concat([self.deltas.pop(), delta])
+                delta = merged[~merged.index.duplicated(keep='last')]
+            elif self.policy == 'drop_oldest':
+                self.deltas.popleft()
+                self.dropped += 1
+        self.deltas.append(delta)
+
+    def get(self) -> DataFrame:
+        return self.deltas.popleft()
+
+
+class RealTimePoller:
+    """
+    Poll real time quotes of a universe on a fixed cadence and emit only the quotes changed since the last poll.
+    A quote is changed if its timestamp, volume or any level of the order book differs from the previous poll.
+    Polls run in a background thread (or an asyncio task when iterated with async for), deltas are passed to the
+    consumer through a bounded RingBuffer.
+    Usage:
+        poller = RealTimePoller(DataCollector(), codes)
+        for delta in poller:
+            print(delta)
+        async for delta in RealTimePoller(AsyncDataCollector(), codes):
+            print(delta)
+    """
+    fields = ["时间戳", "成交量", "买一", "买一量", "买二", "买二量", "买三", "买三量", "买四", "买四量", "买五", "买五量",
+              "卖一", "卖一量", "卖二", "卖二量", "卖三", "卖三量", "卖四", "卖四量", "卖五", "卖五量"]
+
+    def __init__(self, collector: DataCollector, code_list: List, interval: float = 5., chunk_size: int = 60,
+                 buffer_size: int = 64, policy: str = 'coalesce'):
+        """
+        :param collector: DataCollector or AsyncDataCollector of Tencent
+        :param code_list: stock code list
+        :param interval: seconds between two polls, 5 seconds at the fastest, default: 5
+        :param chunk_size: number of stock codes packed into one request, default: 60
+        :param buffer_size: maximum deltas buffered when the consumer is slower than the poller, default: 64
+        :param policy: backpressure policy of the buffer: ['coalesce', 'drop_oldest', 'block'], default: 'coalesce'
+        """
+        assert interval > 0., f"Interval {interval} should be positive."
+        self.collector = collector
+        self.code_list = code_list
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.buffer = RingBuffer(buffer_size, policy)
+        self.last = None
+        self.error = None
+        self.running = False
+        self.condition = None
+        self.loop = None
+        self.thread = None
+
+    def diff(self, df: DataFrame) -> DataFrame:
+        """
+        Compare a snapshot with the previous one, the first snapshot is emitted entirely.
+        :param df: snapshot indexed by stock code, eg: the output of DataCollector.bulk_clean()
+        :return: rows of df changed since the previous snapshot
+        """
+        df = df.dropna(how='all')
+        if self.last is None:
+            changed = np.ones(len(df), dtype=bool)
+        else:
+            previous = self.last.reindex(df.index)[self.fields].to_numpy()
+            current = df[self.fields].to_numpy()
+            # codes missing in the previous snapshot compare as NaN and are always changed
+            changed = (current != previous).any(axis=1)
+        self.last = df
+        return df[changed]
+
+    def poll(self) -> DataFrame:
+        """
+        Poll once synchronously.
+        :return: changed quotes
+        """
+        return self.diff(self.collector.get_batch_real_time_data(self.code_list, self.chunk_size, as_frame=True))
+
+    def schedule(self, deadline: float) -> float:
+        """
+        Return the next poll time, polls are aligned to the cadence and missed ones are skipped instead of drifting.
+        """
+        deadline += self.interval
+        now = time.monotonic()
+        if now > deadline:
+            deadline += ((now - deadline) // self.interval + 1) * self.interval
+        return deadline
+
+    def stop(self):
+        """
+        Stop polling and wake up the poller and the consumer waiting on the buffer, can be called from any thread.
+        """
+        if isinstance(self.condition, asyncio.Condition):
+            # an asyncio condition can only be notified from its own loop
+            self.running = False
+            if not self.loop.is_closed():
+                self.loop.call_soon_threadsafe(asyncio.ensure_future, self.notify_stopped())
+        elif self.condition is not None:
+            with self.condition:
+                self.running = False
+                self.condition.notify_all()
+        else:
+            self.running = False
+
+    def run(self):
+        deadline = time.monotonic()
+        try:
+            while self.running:
+                delta = self.poll()
+                with self.condition:
+                    if self.buffer.policy == 'block':
+                        self.condition.wait_for(lambda: not self.buffer.full() or not self.running)
+                    if len(delta) > 0:
+                        self.buffer.put(delta)
+                        self.condition.notify_all()
+                deadline = self.schedule(deadline)
+                time.sleep(max(0., deadline - time.monotonic()))
+        except Exception as e:
+            self.error = e
+        finally:
+            with self.condition:
+                self.running = False
+                self.condition.notify_all()
+
+    def __iter__(self):
+        self.running = True
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+        try:
+            while True:
+                with self.condition:
+                    self.condition.wait_for(lambda: len(self.buffer) > 0 or not self.running)
+                    if len(self.buffer) == 0:
+                        break
+                    delta = self.buffer.get()
+                    self.condition.notify_all()
+                yield delta
+        finally:
+            with self.condition:
+                self.running = False
+                self.condition.notify_all()
+        if self.error is not None:
+            raise self.error
+
+    async def poll_async(self) -> DataFrame:
+        if asyncio.iscoroutinefunction(self.collector.get_batch_real_time_data):
+            df = await self.collector.get_batch_real_time_data(self.code_list, self.chunk_size, as_frame=True)
+        else:
+            df = await asyncio.get_running_loop().run_in_executor(
+                None, self.collector.get_batch_real_time_data, self.code_list, self.chunk_size, True)
+        return self.diff(df)
+
+    async def notify_stopped(self):
+        async with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+    async def run_async(self):
+        deadline = time.monotonic()
+        try:
+            while self.running:
+                delta = await self.poll_async()
+                async with self.condition:
+                    if self.buffer.policy == 'block':
+                        await self.condition.wait_for(lambda: not self.buffer.full() or not self.running)
+                    if len(delta) > 0:
+                        self.buffer.put(delta)
+                        self.condition.notify_all()
+                deadline = self.schedule(deadline)
+                await asyncio.sleep(max(0., deadline - time.monotonic()))
+        except Exception as e:
+            self.error = e
+        finally:
+            async with self.condition:
+                self.running = False
+                self.condition.notify_all()
+
+    async def __aiter__(self):
+        self.running = True
+        self.condition = asyncio.Condition()
+        self.loop = asyncio.get_running_loop()
+        task = asyncio.ensure_future(self.run_async())
+
+        try:
+            while True:
+                async with self.condition:
+                    await self.condition.wait_for(lambda: len(self.buffer) > 0 or not self.running)
+                    if len(self.buffer) == 0:
+                        break
+                    delta = self.buffer.get()
+                    self.condition.notify_all()
+                yield delta
+        finally:
+            await self.notify_stopped()
+            task.cancel()
+        if self.error is not None:
+            raise self.error
@@ -0,0 +1,190 @@
+import os
+import json
+import datetime
+import shutil
+import pandas as pd
+
+from typing import List, Dict, Optional, Tuple
+from pandas import DataFrame
+from rwad.data.collector.interface import DataCollector
+
+
+class BarCache:
+    """
+    Incremental on-disk cache of historical bars returned by DataCollector.get_historical_data().
+    Bars are stored per (provider, code, freq, adjustment) as a csv file, together with a json file recording the
+    date ranges already fetched, so a query only downloads the missing gaps.
+    Tencent bars are forward adjusted (qfq), so the cached history of a code becomes stale once its adjustment
+    factor changes, call invalidate() explicitly in that case.
+    Layout: {root}/{provider}/{freq}_{adjustment}/{code}.csv and {code}.json
+    """
+    adjustments = {'T': 'qfq', 'N': 'none'}
+
+    def __init__(self, root: str, collector: DataCollector = None):
+        """
+        :param root: cache directory, created if not exists
+        :param collector: collector used to fetch the missing bars, default: DataCollector('T')
+        """
+        self.root = root
+        self.collector = collector if collector is not None else DataCollector('T')
+        assert self.collector.provider in self.adjustments, \
+            f"{self.collector.provider} doesn't support historical data."
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, code: str, freq: str) -> str:
+        provider = self.collector.provider
+        return os.path.join(self.root, provider, f"{freq}_{self.adjustments[provider]}", code.lower())
+
+    def load(self, code: str, freq: str) -> Tuple[Optional[DataFrame], List]:
+        """
+        Load the cached bars and the covered date ranges of a code.
+        :return: (dataframe or None, list of [start_date, end_date])
+        """
+        path = self.path(code, freq)
+        if not os.path.exists(f"{path}.json"):
+            return None, []
+        with open(f"{path}.json", 'r') as f:
+            ranges = json.load(f)["ranges"]
+        try:
+            df = pd.read_csv(f"{path}.csv", dtype={"日期": str, "股票代码": str, "名称": str})
+        except pd.errors.EmptyDataError:
+            df = pd.DataFrame()
+        return df, ranges
+
+    def save(self, code: str, freq: str, df: DataFrame, ranges: List):
+        path = self.path(code, freq)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        df.to_csv(f"{path}.csv", index=False)
+        with open(f"{path}.json", 'w') as f:
+            json.dump({"ranges": ranges}, f)
+
+    @staticmethod
+    def gaps(ranges: List, start_date: str, end_date: str) -> List:
+        """
+        Return the sub ranges of [start_date, end_date] not covered by ranges.
+        :param ranges: sorted and disjoint covered ranges, eg: [["2021-01-01", "2021-06-30"]]
+        :return: list of [start_date, end_date]
+        """
+        day = datetime.timedelta(days=1)
+        start = datetime.date.fromisoformat(start_date)
+        end = datetime.date.fromisoformat(end_date)
+        missing = []
+        for covered_start, covered_end in ranges:
+            covered_start = datetime.date.fromisoformat(covered_start)
+            covered_end = datetime.date.fromisoformat(covered_end)
+            if covered_end < start:
+                continue
+            if covered_start > end:
+                break
+            if covered_start > start:
+                missing.append([start.isoformat(), (covered_start - day).isoformat()])
+            start = covered_end + day
+        if start <= end:
+            missing.append([start.isoformat(), end.isoformat()])
+        return missing
+
+    @staticmethod
+    def merge_ranges(ranges: List) -> List:
+        day = datetime.timedelta(days=1)
+        merged = []
+        for start, end in sorted(ranges):
+            if merged and datetime.date.fromisoformat(start) - day <= datetime.date.fromisoformat(merged[-1][1]):
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        return merged
+
+    @staticmethod
+    def settled(end_date: str) -> str:
+        """
+        Bars of today may still change, so only the ranges ending before today are recorded as covered.
+        """
+        yesterday = (datetime.date.today() - datetime.timedelta(days=1)).isoformat()
+        return min(end_date, yesterday)
+
+    def update(self, code: str, freq: str, cached: Optional[DataFrame], ranges: List,
+               fetched: List[Tuple[List, DataFrame]]) -> DataFrame:
+        frames = [df for _, df in fetched if df is not None and len(df) > 0]
+        if cached is not None:
+            frames.insert(0, cached)
+        df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        if len(df) > 0:
+            df = df.drop_duplicates(subset="日期", keep='last').sort_values("日期").reset_index(drop=True)
+        for (start_date, end_date), fetched_df in fetched:
+            # a failed or missing answer leaves its gap uncovered, so it is fetched again by the next call
+            if not isinstance(fetched_df, DataFrame):
+                continue
+            end_date = self.settled(end_date)
+            if start_date <= end_date:
+                ranges = ranges + [[start_date, end_date]]
+        self.save(code, freq, df, self.merge_ranges(ranges))
+        return df
+
+    @staticmethod
+    def select(df: DataFrame, start_date: str, end_date: str) -> DataFrame:
+        if len(df) == 0:
+            return df
+        dates = df["日期"]
+        return df[(dates >= start_date) & (dates <= end_date)].reset_index(drop=True)
+
+    def get_historical_data(self, code: str, start_date: str, end_date: str, freq: str = 'day') -> DataFrame:
+        """
+        Same as DataCollector.get_historical_data(), only the date ranges not in cache are downloaded.
+        :param code: stock code
+        :param start_date: data starts with this date, form: YYYY-mm-dd
+        :param end_date: data ends with this date, form: YYYY-mm-dd
+        :param freq: frequency: ['day', 'month'], default: 'day' (for day)
+        :return: a dataframe of bars between start_date and end_date
+        """
+        cached, ranges = self.load(code, freq)
+        fetched = [(gap, self.collector.get_historical_data(code, gap[0], gap[1], freq))
+                   for gap in self.gaps(ranges, start_date, end_date)]
+        if fetched:
+            cached = self.update(code, freq, cached, ranges, fetched)
+        return self.select(cached, start_date, end_date)
+
+    def get_batch_historical_data(self, code_list: List, start_date: str, end_date: str,
+                                  freq: str = 'day') -> Dict:
+        """
+        Same as DataCollector.get_batch_historical_data(), codes missing the same date range are downloaded
+        together in one batch, eg: a nightly refresh only fetches the last day of all the codes in one batch.
+        :return: a dict of Dataframe
+        """
+        cache = {code: self.load(code, freq) for code in code_list}
+        batches = {}
+        for code, (_, ranges) in cache.items():
+            for gap in self.gaps(ranges, start_date, end_date):
+                batches.setdefault(tuple(gap), []).append(code)
+
+        fetched = {code: [] for code in code_list}
+        for gap, codes in batches.items():
+            df_dict = self.collector.get_batch_historical_data(codes, gap[0], gap[1], freq)
+            for code in codes:
+                fetched[code].append((list(gap), df_dict.get(code)))
+
+        df_dict = {}
+        for code, (cached, ranges) in cache.items():
+            if fetched[code]:
+                cached = self.update(code, freq, cached, ranges, fetched[code])
+            df_dict[code] = self.select(cached, start_date, end_date)
+        return df_dict
+
+    def invalidate(self, code: str = None, freq: str = None):
+        """
+        Remove cached bars, eg: after the adjustment factor of a code changes.
+        :param code: stock code, default: None (for all the codes)
+        :param freq: frequency, default: None (for all the frequencies)
+        """
+        provider_dir = os.path.join(self.root, self.collector.provider)
+        if not os.path.exists(provider_dir):
+            return
+        for freq_dir in os.listdir(provider_dir):
+            if freq is not None and not freq_dir.startswith(f"{freq}_"):
+                continue
+            if code is None:
+                shutil.rmtree(os.path.join(provider_dir, freq_dir))
+                continue
+            for suffix in ['.csv', '.json']:
+                path = os.path.join(provider_dir, freq_dir, f"{code.lower()}{suffix}")
+                if os.path.exists(path):
+                    os.remove(path)
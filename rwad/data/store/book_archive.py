@@ -0,0 +1,258 @@
+import os
+import json
+import zlib
+import struct
+import numpy as np
+import pandas as pd
+
+from typing import List, Optional, Tuple
+from pandas import DataFrame, Series
+
+
+class BookArchive:
+    """
+    Delta-compressed archive of the 5-level order book and order flow fields of real time snapshots.
+    Every field is encoded as an integer (prices in 0.001, the tick of sh90 B shares, ratios in thousandths).
+    Each appended snapshot is one block: codes whose keyframe is due store their full book, the others store only the
+    fields changed since their previous snapshot, as a 32-bit change mask plus the deltas in the smallest integer
+    dtype that fits.
+    Unchanged codes are not stored at all, and the whole block is zlib compressed.
+    Blocks are indexed by time and keyframes by code then time, so the book of a code at any timestamp is rebuilt
+    from its last keyframe, found by binary search, by decoding at most keyframe_interval blocks.
+    Layout:
+        {root}/codes.json           stock codes, the position in the list is the code id
+        {root}/YYYYmmdd/book.bin    blocks, each is a uint32 length followed by the compressed block
+        {root}/YYYYmmdd/blocks.bin  int64 (snapshot time, offset in book.bin) per block
+        {root}/YYYYmmdd/keys.bin    int64 (code id, snapshot time, block number) per keyframe
+    """
+    fields = ["买一", "买二", "买三", "买四", "买五", "卖一", "卖二", "卖三", "卖四", "卖五",
+              "买一量", "买二量", "买三量", "买四量", "买五量", "卖一量", "卖二量", "卖三量", "卖四量", "卖五量",
+              "外盘", "内盘", "买盘大单", "买盘小单", "卖盘大单", "卖盘小单"]
+    scales = np.array([1000.] * 10 + [1.] * 12 + [1000.] * 4)
+    header = struct.Struct("<qiiiBB")
+
+    def __init__(self, root: str, keyframe_interval: int = 60):
+        """
+        :param root: archive directory, created if not exists
+        :param keyframe_interval: snapshots of a code between two keyframes, default: 60 (5 minutes of 5s polls)
+        """
+        assert keyframe_interval > 0, f"Keyframe interval {keyframe_interval} should be positive."
+        self.root = root
+        self.keyframe_interval = keyframe_interval
+        os.makedirs(root, exist_ok=True)
+        codes_path = os.path.join(root, "codes.json")
+        if os.path.exists(codes_path):
+            with open(codes_path, 'r') as f:
+                self.codes = json.load(f)
+        else:
+            self.codes = []
+        self.code_ids = {code: i for i, code in enumerate(self.codes)}
+        self.date = None
+        # (date, file name) -> (bytes read, rows), see load()
+        self.cache = {}
+        # date -> (keyframes read, first keyframe of each code id, keyframes sorted by code then time), see keys()
+        self.key_index = {}
+        self.state = np.zeros((0, len(self.fields)), dtype=np.int64)
+        self.count = np.zeros(0, dtype=np.int64)
+        self.known = np.zeros(0, dtype=bool)
+
+    def encode(self, code_list: List) -> np.ndarray:
+        """
+        Map stock codes to code ids, unseen codes are registered.
+        """
+        size = len(self.codes)
+        for code in code_list:
+            code = code.lower()
+            if code not in self.code_ids:
+                self.code_ids[code] = len(self.codes)
+                self.codes.append(code)
+        if len(self.codes) > size:
+            with open(os.path.join(self.root, "codes.json"), 'w') as f:
+                json.dump(self.codes, f)
+        if len(self.codes) > len(self.known):
+            grow = max(len(self.codes), 2 * len(self.known)) - len(self.known)
+            self.state = np.concatenate([self.state, np.zeros((grow, len(self.fields)), dtype=np.int64)])
+            self.count = np.concatenate([self.count, np.zeros(grow, dtype=np.int64)])
+            self.known = np.concatenate([self.known, np.zeros(grow, dtype=bool)])
+        return np.array([self.code_ids[code.lower()] for code in code_list], dtype=np.int64)
+
+    @staticmethod
+    def smallest(values: np.ndarray) -> np.ndarray:
+        for dtype in [np.int8, np.int16, np.int32]:
+            info = np.iinfo(dtype)
+            if len(values) == 0 or (values.min() >= info.min and values.max() <= info.max):
+                return values.astype(dtype)
+        return values.astype(np.int64)
+
+    def append(self, df: DataFrame, snapshot: int = None):
+        """
+        Append one snapshot of many stocks.
+        :param df: snapshot indexed by stock code, eg: the output of DataCollector.bulk_clean()
+        :param snapshot: snapshot time, form: YYYYmmddHHMMSS, default: the latest '时间戳' in df
+        """
+        if len(df) == 0:
+            return
+        if snapshot is None:
+            snapshot = int(df["时间戳"].max())
+        date = str(snapshot // 1000000)
+        partition = os.path.join(self.root, date)
+        os.makedirs(partition, exist_ok=True)
+        blocks = self.blocks(date)
+        assert len(blocks) == 0 or blocks[-1, 0] <= snapshot, f"Snapshot {snapshot} is earlier than {blocks[-1, 0]}."
+        if date != self.date:
+            # the first snapshot of a partition opened by this writer is a keyframe of every code
+            self.date = date
+            self.known[:] = False
+
+        idx = self.encode(list(df.index))
+        values = np.round(np.nan_to_num(df.reindex(columns=self.fields).to_numpy(dtype=np.float64)) * self.scales)
+        values = values.astype(np.int64)
+        key = ~self.known[idx] | (self.count[idx] >= self.keyframe_interval)
+        delta = values - self.state[idx]
+        masks = ((delta != 0) << np.arange(len(self.fields), dtype=np.int64)).sum(axis=1).astype(np.uint32)
+        changed = ~key & (masks != 0)
+
+        self.state[idx] = values
+        self.known[idx] = True
+        self.count[idx] = np.where(key, 1, self.count[idx] + 1)
+
+        key_values = self.smallest(values[key].ravel())
+        delta_values = self.smallest(delta[changed][delta[changed] != 0])
+        block = self.header.pack(snapshot, int(key.sum()), int(changed.sum()), len(key_values),
+                                 key_values.itemsize, delta_values.itemsize) \
+            + idx[key].astype(np.int32).tobytes() + idx[changed].astype(np.int32).tobytes() \
+            + masks[changed].tobytes() + key_values.tobytes() + delta_values.tobytes()
+        block = zlib.compress(block)
+
+        with open(os.path.join(partition, "book.bin"), 'ab') as f:
+            offset = f.tell()
+            f.write(struct.pack("<I", len(block)) + block)
+        number = len(blocks)
+        with open(os.path.join(partition, "blocks.bin"), 'ab') as f:
+            f.write(np.array([snapshot, offset], dtype=np.int64).tobytes())
+        keys = np.stack([idx[key], np.full(int(key.sum()), snapshot), np.full(int(key.sum()), number)], axis=1)
+        with open(os.path.join(partition, "keys.bin"), 'ab') as f:
+            f.write(keys.astype(np.int64).tobytes())
+
+    def decode(self, data: bytes) -> Tuple:
+        """
+        :return: (snapshot, keyframe code ids, keyframe values, changed code ids, changed deltas), values and deltas
+        are (codes x fields) int64 arrays
+        """
+        data = zlib.decompress(data)
+        snapshot, n_key, n_changed, n_values, key_size, delta_size = self.header.unpack_from(data)
+        dtypes = {1: np.int8, 2: np.int16, 4: np.int32, 8: np.int64}
+        pos = self.header.size
+        key_idx = np.frombuffer(data, np.int32, n_key, pos)
+        pos += 4 * n_key
+        changed_idx = np.frombuffer(data, np.int32, n_changed, pos)
+        pos += 4 * n_changed
+        masks = np.frombuffer(data, np.uint32, n_changed, pos).astype(np.int64)
+        pos += 4 * n_changed
+        key_values = np.frombuffer(data, dtypes[key_size], n_values, pos).astype(np.int64)
+        pos += key_size * n_values
+        bits = (masks[:, np.newaxis] >> np.arange(len(self.fields))) & 1 == 1
+        deltas = np.zeros(bits.shape, dtype=np.int64)
+        deltas[bits] = np.frombuffer(data, dtypes[delta_size], int(bits.sum()), pos)
+        return snapshot, key_idx, key_values.reshape(n_key, len(self.fields)), changed_idx, deltas
+
+    def load(self, date: str, name: str, width: int) -> np.ndarray:
+        """
+        Rows of an append-only int64 index file of a partition, only the bytes appended since the last call are read.
+        """
+        path = os.path.join(self.root, date, name)
+        size, rows = self.cache.get((date, name), (0, np.zeros((0, width), dtype=np.int64)))
+        end = os.path.getsize(path) // (8 * width) * 8 * width if os.path.exists(path) else 0
+        if end > size:
+            with open(path, 'rb') as f:
+                f.seek(size)
+                tail = np.frombuffer(f.read(end - size), dtype=np.int64).reshape(-1, width)
+            rows = np.concatenate([rows, tail])
+            self.cache[(date, name)] = (end, rows)
+        return rows
+
+    def blocks(self, date: str) -> np.ndarray:
+        """
+        :return: (snapshot time, offset in book.bin) of every block of a partition
+        """
+        return self.load(date, "blocks.bin", 2)
+
+    def keys(self, date: str):
+        """
+        Per code time index of the keyframes of a partition.
+        :return: (first keyframe of each code id, keyframes sorted by code then time), the keyframes of code id i are
+        rows starts[i]: starts[i + 1] of (code id, snapshot time, block number)
+        """
+        keys = self.load(date, "keys.bin", 3)
+        count, starts, index = self.key_index.get(date, (-1, None, None))
+        if count != len(keys) or len(starts) <= len(self.codes):
+            # keyframes are appended in time order, a stable sort by code keeps them in time order per code
+            index = keys[np.argsort(keys[:, 0], kind='stable')]
+            starts = np.searchsorted(index[:, 0], np.arange(len(self.codes) + 1))
+            self.key_index[date] = (len(keys), starts, index)
+        return starts, index
+
+    def read_blocks(self, date: str, start: int, end: int):
+        """
+        Decode the blocks numbered in [start, end).
+        """
+        blocks = self.blocks(date)
+        if start >= end:
+            return
+        with open(os.path.join(self.root, date, "book.bin"), 'rb') as f:
+            f.seek(int(blocks[start, 1]))
+            for _ in range(start, end):
+                size, = struct.unpack("<I", f.read(4))
+                yield self.decode(f.read(size))
+
+    def to_series(self, values: np.ndarray) -> Series:
+        return pd.Series(values / self.scales, index=self.fields)
+
+    def book(self, code: str, timestamp: int) -> Optional[Series]:
+        """
+        Rebuild the book of a code at a timestamp.
+        :param code: stock code
+        :param timestamp: form: YYYYmmddHHMMSS
+        :return: the fields of the latest snapshot of the code not later than timestamp, None if not found
+        """
+        date = str(timestamp // 1000000)
+        code_id = self.code_ids.get(code.lower())
+        if code_id is None:
+            return None
+        starts, index = self.keys(date)
+        keys = index[starts[code_id]: starts[code_id + 1]]
+        last = int(np.searchsorted(keys[:, 1], timestamp, side='right')) - 1
+        if last < 0:
+            return None
+        end = int(np.searchsorted(self.blocks(date)[:, 0], timestamp, side='right'))
+
+        values = None
+        for _, key_idx, key_values, changed_idx, deltas in self.read_blocks(date, int(keys[last, 2]), end):
+            hit = np.flatnonzero(key_idx == code_id)
+            if len(hit) > 0:
+                values = key_values[hit[0]].copy()
+            hit = np.flatnonzero(changed_idx == code_id)
+            if len(hit) > 0 and values is not None:
+                values += deltas[hit[0]]
+        return self.to_series(values)
+
+    def replay(self, date: str, start: int = None, end: int = None):
+        """
+        Replay a trading date snapshot by snapshot.
+        :param date: trading date, form: YYYYmmdd
+        :param start: first snapshot yielded, form: YYYYmmddHHMMSS, default: None (from the beginning)
+        :param end: last snapshot yielded, form: YYYYmmddHHMMSS, default: None (till the end)
+        :return: iterator of (snapshot, dataframe of the books of all the codes seen so far, indexed by code)
+        """
+        state = np.zeros((len(self.codes), len(self.fields)), dtype=np.int64)
+        seen = np.zeros(len(self.codes), dtype=bool)
+        codes = np.array(self.codes, dtype=object)
+        for snapshot, key_idx, key_values, changed_idx, deltas in self.read_blocks(date, 0, len(self.blocks(date))):
+            if end is not None and snapshot > end:
+                break
+            state[key_idx] = key_values
+            state[changed_idx] += deltas
+            seen[key_idx] = True
+            if start is None or snapshot >= start:
+                idx = np.flatnonzero(seen)
+                yield snapshot, pd.DataFrame(state[idx] / self.scales, index=codes[idx], columns=self.fields)
@@ -0,0 +1,94 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+from typing import List, Dict
+from pandas import DataFrame
+
+
+class Panel:
+    """
+    Aligned (date x code x field) float32 array of historical bars on a shared trading calendar.
+    Missing bars (eg: suspension, or dates before listing) are NaN and False in the (date x code) mask.
+    A panel is saved as .npy files plus a json index, and loaded back by memory mapping, so factor and backtest
+    code can slice the whole market without copying.
+    Layout: {path}/values.npy, {path}/mask.npy and {path}/index.json (dates, codes and fields)
+    """
+    def __init__(self, dates: np.ndarray, codes: List, fields: List, values: np.ndarray, mask: np.ndarray):
+        assert values.shape == (len(dates), len(codes), len(fields)), "Values don't match the index."
+        assert mask.shape == values.shape[: 2], "Mask doesn't match the values."
+        self.dates = np.asarray(dates)
+        self.codes = list(codes)
+        self.fields = list(fields)
+        self.values = values
+        self.mask = mask
+        self.code_ids = {code: i for i, code in enumerate(self.codes)}
+
+    @classmethod
+    def from_dict(cls, df_dict: Dict, time_column: str = "日期", fields: List = None) -> 'Panel':
+        """
+        Build a panel from a dict of bar dataframes, eg: the output of get_batch_historical_data().
+        :param df_dict: a dict of dataframe keyed by stock code
+        :param time_column: column of bar dates, default: '日期'
+        :param fields: columns converted to float32, default: None (for all the columns of the first dataframe
+        except time_column, '股票代码' and '名称')
+        :return: panel whose calendar is the union of all the dates
+        """
+        frames = [df for df in df_dict.values() if len(df) > 0]
+        if fields is None:
+            fields = [column for column in frames[0].columns if column not in [time_column, "股票代码", "名称"]] \
+                if frames else []
+        dates = np.unique(np.concatenate([df[time_column].to_numpy(dtype=str) for df in frames])) \
+            if frames else np.zeros(0, dtype=str)
+
+        values = np.full((len(dates), len(df_dict), len(fields)), np.nan, dtype=np.float32)
+        mask = np.zeros((len(dates), len(df_dict)), dtype=bool)
+        for i, df in enumerate(df_dict.values()):
+            if len(df) == 0:
+                continue
+            rows = np.searchsorted(dates, df[time_column].to_numpy(dtype=str))
+            values[rows, i, :] = df[fields].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float32)
+            mask[rows, i] = True
+        return cls(dates, list(df_dict.keys()), fields, values, mask)
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "values.npy"), self.values)
+        np.save(os.path.join(path, "mask.npy"), self.mask)
+        with open(os.path.join(path, "index.json"), 'w', encoding='utf-8') as f:
+            json.dump({"dates": self.dates.tolist(), "codes": self.codes, "fields": self.fields}, f,
+                      ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> 'Panel':
+        """
+        :param path: directory written by save()
+        :param mmap: memory map the arrays read-only instead of reading them, default: True
+        """
+        mmap_mode = 'r' if mmap else None
+        with open(os.path.join(path, "index.json"), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        return cls(np.array(index["dates"]), index["codes"], index["fields"],
+                   np.load(os.path.join(path, "values.npy"), mmap_mode=mmap_mode),
+                   np.load(os.path.join(path, "mask.npy"), mmap_mode=mmap_mode))
+
+    def field(self, name: str) -> np.ndarray:
+        """
+        :return: (date x code) view of a field
+        """
+        return self.values[:, :, self.fields.index(name)]
+
+    def between(self, start_date: str = None, end_date: str = None) -> 'Panel':
+        """
+        Slice a date range, the arrays of the returned panel are views of this one.
+        """
+        lo = 0 if start_date is None else int(np.searchsorted(self.dates, start_date, side='left'))
+        hi = len(self.dates) if end_date is None else int(np.searchsorted(self.dates, end_date, side='right'))
+        return Panel(self.dates[lo: hi], self.codes, self.fields, self.values[lo: hi], self.mask[lo: hi])
+
+    def to_frame(self, name: str) -> DataFrame:
+        """
+        :return: (date x code) dataframe of a field
+        """
+        return pd.DataFrame(self.field(name), index=self.dates, columns=self.codes, copy=False)
@@ -0,0 +1,156 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+from typing import List, Dict, Optional
+from pandas import DataFrame
+from rwad.data.collector.interface import DataCollector
+
+
+class TickStore:
+    """
+    Append-only columnar store of real time snapshots, i.e. the output of DataCollector.bulk_clean().
+    Snapshots are partitioned by trading date, every column is a flat binary file of fixed dtype which is read back
+    by memory mapping, so a full-market day can be scanned without loading it into memory.
+    Rows are appended snapshot by snapshot, the snapshot time of each row is stored as a sorted column, so range
+    queries by time are binary searches and only the selected rows are copied out.
+    Layout:
+        {root}/schema.json      column names and dtypes
+        {root}/codes.json       stock codes, the position in the list is the code id
+        {root}/YYYYmmdd/        one partition per trading date, containing code.bin (int32 code id),
+                                snapshot.bin (int64 YYYYmmddHHMMSS) and one {i}.bin per column
+    """
+    def __init__(self, root: str, columns: List = None, int_columns: List = None):
+        """
+        :param root: store directory, created if not exists
+        :param columns: stored factors, default: the 62 factors of DataCollector.clean()
+        :param int_columns: factors stored as int64, others are stored as float32, default: volumes and timestamp
+        """
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        schema_path = os.path.join(root, "schema.json")
+
+        if os.path.exists(schema_path):
+            with open(schema_path, 'r', encoding='utf-8') as f:
+                schema = json.load(f)
+        else:
+            collector = DataCollector()
+            columns = columns if columns is not None else [key for key in collector.raw_columns if 'x' not in key]
+            int_columns = int_columns if int_columns is not None else collector.int_columns
+            schema = {"columns": columns,
+                      "dtypes": ['int64' if column in int_columns else 'float32' for column in columns]}
+            with open(schema_path, 'w', encoding='utf-8') as f:
+                json.dump(schema, f, ensure_ascii=False)
+        self.columns = schema["columns"]
+        self.dtypes = [np.dtype(dtype) for dtype in schema["dtypes"]]
+
+        codes_path = os.path.join(root, "codes.json")
+        if os.path.exists(codes_path):
+            with open(codes_path, 'r') as f:
+                self.codes = json.load(f)
+        else:
+            self.codes = []
+        self.code_ids = {code: i for i, code in enumerate(self.codes)}
+
+    def encode(self, code_list: List) -> np.ndarray:
+        """
+        Map stock codes to code ids, unseen codes are registered.
+        """
+        size = len(self.codes)
+        for code in code_list:
+            code = code.lower()
+            if code not in self.code_ids:
+                self.code_ids[code] = len(self.codes)
+                self.codes.append(code)
+        if len(self.codes) > size:
+            with open(os.path.join(self.root, "codes.json"), 'w') as f:
+                json.dump(self.codes, f)
+        return np.array([self.code_ids[code.lower()] for code in code_list], dtype=np.int32)
+
+    def dates(self) -> List:
+        return sorted(name for name in os.listdir(self.root) if name.isdigit() and len(name) == 8)
+
+    def append(self, df: DataFrame, snapshot: int = None):
+        """
+        Append one snapshot of many stocks.
+        :param df: dataframe indexed by stock code, eg: the output of DataCollector.bulk_clean()
+        :param snapshot: snapshot time, form: YYYYmmddHHMMSS, must not be earlier than the last appended one
+        of the same date, default: the latest '时间戳' in df
+        """
+        if len(df) == 0:
+            return
+        if snapshot is None:
+            snapshot = int(df["时间戳"].max())
+        partition = os.path.join(self.root, str(snapshot // 1000000))
+        os.makedirs(partition, exist_ok=True)
+
+        last = self.partition(str(snapshot // 1000000))["snapshot"]
+        assert len(last) == 0 or last[-1] <= snapshot, f"Snapshot {snapshot} is earlier than {last[-1]}."
+
+        with open(os.path.join(partition, "code.bin"), 'ab') as f:
+            f.write(self.encode(df.index).tobytes())
+        with open(os.path.join(partition, "snapshot.bin"), 'ab') as f:
+            f.write(np.full(len(df), snapshot, dtype=np.int64).tobytes())
+        for i, (column, dtype) in enumerate(zip(self.columns, self.dtypes)):
+            values = df[column].to_numpy() if column in df.columns else np.zeros(len(df))
+            if dtype.kind == 'i':
+                values = np.nan_to_num(values)
+            with open(os.path.join(partition, f"{i}.bin"), 'ab') as f:
+                f.write(values.astype(dtype).tobytes())
+
+    @staticmethod
+    def mmap(path: str, dtype: np.dtype, rows: int = None) -> np.ndarray:
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return np.zeros(0, dtype=dtype)
+        data = np.memmap(path, dtype=dtype, mode='r')
+        return data if rows is None else data[: rows]
+
+    def partition(self, date: str) -> Dict:
+        """
+        Memory map a partition without reading it.
+        :param date: trading date, form: YYYYmmdd
+        :return: a dict of read-only arrays, including 'code', 'snapshot' and all the factor columns
+        """
+        path = os.path.join(self.root, date)
+        # an interrupted append may leave columns of different lengths, only the complete rows are visible
+        rows = len(self.mmap(os.path.join(path, "snapshot.bin"), np.int64))
+        rows = min([rows, len(self.mmap(os.path.join(path, "code.bin"), np.int32))]
+                   + [len(self.mmap(os.path.join(path, f"{i}.bin"), dtype)) for i, dtype in enumerate(self.dtypes)])
+        data = {"code": self.mmap(os.path.join(path, "code.bin"), np.int32, rows),
+                "snapshot": self.mmap(os.path.join(path, "snapshot.bin"), np.int64, rows)}
+        for i, (column, dtype) in enumerate(zip(self.columns, self.dtypes)):
+            data[column] = self.mmap(os.path.join(path, f"{i}.bin"), dtype, rows)
+        return data
+
+    def query(self, code: Optional[str] = None, start: int = None, end: int = None,
+              columns: List = None) -> DataFrame:
+        """
+        Return the snapshots between start and end.
+        :param code: stock code, default: None (for all the codes)
+        :param start: start snapshot time (inclusive), form: YYYYmmddHHMMSS, default: None (from the beginning)
+        :param end: end snapshot time (inclusive), form: YYYYmmddHHMMSS, default: None (till the end)
+        :param columns: factors returned, default: None (for all the factors)
+        :return: dataframe with 'code' and 'snapshot' columns followed by the factors
+        """
+        columns = columns if columns is not None else self.columns
+        code_id = self.code_ids.get(code.lower(), -1) if code is not None else None
+        codes = np.array(self.codes, dtype=object)
+        frames = []
+
+        for date in self.dates():
+            if (start is not None and int(date) < start // 1000000) or (end is not None and int(date) > end // 1000000):
+                continue
+            data = self.partition(date)
+            lo = 0 if start is None else int(np.searchsorted(data["snapshot"], start, side='left'))
+            hi = len(data["snapshot"]) if end is None else int(np.searchsorted(data["snapshot"], end, side='right'))
+            rows = np.arange(lo, hi)
+            if code_id is not None:
+                rows = rows[data["code"][lo: hi] == code_id]
+            frame = {"code": codes[data["code"][rows]], "snapshot": data["snapshot"][rows]}
+            frame.update({column: data[column][rows] for column in columns})
+            frames.append(pd.DataFrame(frame))
+
+        if not frames:
+            return pd.DataFrame(columns=["code", "snapshot"] + list(columns))
+        return pd.concat(frames, ignore_index=True)
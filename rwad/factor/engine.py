@@ -0,0 +1,291 @@
+import numpy as np
+import pandas as pd
+
+from typing import List, Dict
+
+
+def rolling_sums(arrays: List[np.ndarray], window: int) -> List[np.ndarray]:
+    """
+    Rolling sums over the time axis of (time x code) arrays by differencing cumulative sums, NaN counts as 0.
+    """
+    sums = []
+    for array in arrays:
+        cumsum = np.zeros((array.shape[0] + 1,) + array.shape[1:], dtype=np.float64)
+        np.cumsum(np.nan_to_num(array), axis=0, out=cumsum[1:])
+        lower = np.maximum(np.arange(1, array.shape[0] + 1) - window, 0)
+        sums.append(cumsum[1:] - cumsum[lower])
+    return sums
+
+
+class Window:
+    def __init__(self, history: List[np.ndarray], window: int):
+        """
+        Ring buffer of the last window rows of several aligned series, with their running sums.
+        :param history: (time x code) arrays, the last window rows fill the buffer
+        :param window: rolling window
+        """
+        self.window = window
+        self.pos = 0
+        self.buffers = []
+        for array in history:
+            buffer = np.full((window, array.shape[1]), np.nan)
+            rows = array[-window:]
+            buffer[window - len(rows):] = rows
+            self.buffers.append(buffer)
+
+    def push(self, rows: List[np.ndarray]) -> List[np.ndarray]:
+        """
+        Replace the oldest rows by the new ones.
+        :return: the rows dropped out of the window
+        """
+        old = [buffer[self.pos].copy() for buffer in self.buffers]
+        for buffer, row in zip(self.buffers, rows):
+            buffer[self.pos] = row
+        self.pos = (self.pos + 1) % self.window
+        return old
+
+
+class Factor:
+    """
+    Node of a factor expression over (time x code) arrays. Nodes are identified by their key, so the same
+    sub-expression (eg: the returns used by several candidate factors) is computed once per FactorEngine.
+    compute() evaluates the whole history at once, init() and step() update the latest row in O(codes).
+    """
+    def __init__(self, key: str, inputs: List['Factor']):
+        self.key = key
+        self.inputs = inputs
+
+    def __repr__(self):
+        return self.key
+
+    def compute(self, engine: 'FactorEngine') -> np.ndarray:
+        raise NotImplementedError
+
+    def init(self, engine: 'FactorEngine'):
+        raise NotImplementedError
+
+    def step(self, engine: 'FactorEngine') -> np.ndarray:
+        raise NotImplementedError
+
+
+class Field(Factor):
+    def __init__(self, name: str):
+        super().__init__(name, [])
+        self.name = name
+
+    def compute(self, engine):
+        return np.asarray(engine.data[self.name], dtype=np.float64)
+
+    def init(self, engine):
+        pass
+
+    def step(self, engine):
+        return np.asarray(engine.row[self.name], dtype=np.float64)
+
+
+class Returns(Factor):
+    def __init__(self, x: Factor, period: int = 1):
+        assert period > 0, f"Period {period} should be positive."
+        super().__init__(f"returns({x.key},{period})", [x])
+        self.period = period
+        self.state = None
+
+    def compute(self, engine):
+        x = engine.evaluate(self.inputs[0])
+        result = np.full(x.shape, np.nan)
+        result[self.period:] = x[self.period:] / x[: -self.period] - 1.
+        return result
+
+    def init(self, engine):
+        self.state = Window([engine.evaluate(self.inputs[0])], self.period)
+
+    def step(self, engine):
+        x = engine.latest(self.inputs[0])
+        old, = self.state.push([x])
+        return x / old - 1.
+
+
+class Rolling(Factor):
+    def __init__(self, name: str, inputs: List[Factor], window: int, min_periods: int = None):
+        assert window > 1, f"Window {window} should be greater than 1."
+        super().__init__(f"{name}({','.join(x.key for x in inputs)},{window})", inputs)
+        self.window = window
+        self.min_periods = window if min_periods is None else min_periods
+        self.state = None
+        self.sums = None
+
+    def series(self, inputs: List[np.ndarray]) -> List[np.ndarray]:
+        """
+        Series summed over the window, derived from the input rows, NaN rows are excluded.
+        """
+        raise NotImplementedError
+
+    def finish(self, sums: List[np.ndarray]) -> np.ndarray:
+        raise NotImplementedError
+
+    def compute(self, engine):
+        return self.finish(rolling_sums(self.series([engine.evaluate(x) for x in self.inputs]), self.window))
+
+    def init(self, engine):
+        history = self.series([engine.evaluate(x) for x in self.inputs])
+        self.state = Window(history, self.window)
+        self.sums = [np.nansum(buffer, axis=0) for buffer in self.state.buffers]
+
+    def step(self, engine):
+        rows = self.series([engine.latest(x)[np.newaxis] for x in self.inputs])
+        rows = [row[0] for row in rows]
+        old = self.state.push(rows)
+        self.sums = [total + np.nan_to_num(row) - np.nan_to_num(out) for total, row, out in zip(self.sums, rows, old)]
+        return self.finish([total[np.newaxis] for total in self.sums])[0]
+
+
+class Mean(Rolling):
+    def __init__(self, x: Factor, window: int, min_periods: int = None):
+        super().__init__("mean", [x], window, min_periods)
+
+    def series(self, inputs):
+        x, = inputs
+        return [x, np.isfinite(x).astype(np.float64)]
+
+    def finish(self, sums):
+        total, count = sums
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(count >= self.min_periods, total / count, np.nan)
+
+
+class Std(Rolling):
+    def __init__(self, x: Factor, window: int, min_periods: int = None):
+        super().__init__("std", [x], window, min_periods)
+
+    def series(self, inputs):
+        x, = inputs
+        return [x, x * x, np.isfinite(x).astype(np.float64)]
+
+    def finish(self, sums):
+        total, square, count = sums
+        with np.errstate(invalid='ignore', divide='ignore'):
+            variance = (square - total * total / count) / (count - 1.)
+            return np.where(count >= max(self.min_periods, 2), np.sqrt(np.maximum(variance, 0.)), np.nan)
+
+
+class Corr(Rolling):
+    def __init__(self, x: Factor, y: Factor, window: int, min_periods: int = None):
+        super().__init__("corr", [x, y], window, min_periods)
+
+    def series(self, inputs):
+        x, y = inputs
+        valid = np.isfinite(x) & np.isfinite(y)
+        x = np.where(valid, x, np.nan)
+        y = np.where(valid, y, np.nan)
+        return [x, y, x * y, x * x, y * y, valid.astype(np.float64)]
+
+    def finish(self, sums):
+        sx, sy, sxy, sxx, syy, count = sums
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cov = sxy - sx * sy / count
+            corr = cov / np.sqrt((sxx - sx * sx / count) * (syy - sy * sy / count))
+            return np.where(count >= max(self.min_periods, 2), corr, np.nan)
+
+
+class ZScore(Factor):
+    def __init__(self, x: Factor, window: int):
+        self.mean = Mean(x, window)
+        self.std = Std(x, window)
+        super().__init__(f"zscore({x.key},{window})", [x, self.mean, self.std])
+
+    def compute(self, engine):
+        x, mean, std = [engine.evaluate(node) for node in self.inputs]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (x - mean) / std
+
+    def init(self, engine):
+        pass
+
+    def step(self, engine):
+        x, mean, std = [engine.latest(node) for node in self.inputs]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (x - mean) / std
+
+
+class Rank(Factor):
+    def __init__(self, x: Factor):
+        super().__init__(f"rank({x.key})", [x])
+
+    def compute(self, engine):
+        return pd.DataFrame(engine.evaluate(self.inputs[0])).rank(axis=1, pct=True).to_numpy()
+
+    def init(self, engine):
+        pass
+
+    def step(self, engine):
+        return pd.Series(engine.latest(self.inputs[0])).rank(pct=True).to_numpy()
+
+
+class FactorEngine:
+    """
+    Evaluate factors vectorized across all the codes at once.
+    Full mode evaluates the whole (time x code) history, sub-expressions shared by several factors are cached by
+    key and computed once. Incremental mode (start() then append()) keeps rolling state, so a new bar updates every
+    factor in O(codes) instead of recomputing the whole window.
+    Usage:
+        close = Field("收盘价")
+        factors = [ZScore(Returns(close), 20), Corr(Returns(close), Field("成交量（手）"), 20)]
+        engine = FactorEngine({"收盘价": panel.field("收盘价"), "成交量（手）": panel.field("成交量（手）")})
+        history = engine.evaluate_all(factors)
+        engine.start(factors)
+        latest = engine.append({"收盘价": close_row, "成交量（手）": volume_row})
+    """
+    def __init__(self, data: Dict[str, np.ndarray]):
+        """
+        :param data: (time x code) arrays keyed by field name, eg: Panel.field() views
+        """
+        self.data = data
+        self.cache = {}
+        self.nodes = []
+        self.row = None
+        self.values = {}
+
+    def evaluate(self, factor: Factor) -> np.ndarray:
+        """
+        :return: (time x code) values of a factor over the whole history, cached by key
+        """
+        if factor.key not in self.cache:
+            self.cache[factor.key] = factor.compute(self)
+        return self.cache[factor.key]
+
+    def evaluate_all(self, factors: List[Factor]) -> Dict[str, np.ndarray]:
+        return {factor.key: self.evaluate(factor) for factor in factors}
+
+    def start(self, factors: List[Factor]):
+        """
+        Switch to incremental mode, the rolling state of every node is initialized from the current history.
+        """
+        nodes = {}
+
+        def visit(node: Factor):
+            for child in node.inputs:
+                visit(child)
+            if node.key not in nodes:
+                nodes[node.key] = node
+
+        for factor in factors:
+            visit(factor)
+        self.nodes = list(nodes.values())
+        for node in self.nodes:
+            node.init(self)
+        self.cache = {}
+
+    def latest(self, factor: Factor) -> np.ndarray:
+        return self.values[factor.key]
+
+    def append(self, row: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """
+        Append one bar of all the codes.
+        :param row: (code,) arrays keyed by field name
+        :return: latest values of every node keyed by factor key
+        """
+        self.row = row
+        self.values = {}
+        for node in self.nodes:
+            self.values[node.key] = node.step(self)
+        return self.values
@@ -0,0 +1,90 @@
+import threading
+import numpy as np
+import pandas as pd
+
+from pandas import DataFrame
+
+
+class Metrics:
+    """
+    Metrics hook of DataCollector and Position, the default does nothing.
+    Callers only start timers when enabled is True, so the default costs one attribute check per call.
+    Subclass and override the methods to forward measurements elsewhere, eg: to a monitoring client.
+    """
+    enabled = False
+
+    def request(self, provider: str, endpoint: str, latency: float, size: int, retries: int = 0):
+        """
+        :param provider: data provider: ['T', 'N', 'S']
+        :param endpoint: endpoint name, eg: 'fqkline', 'quote'
+        :param latency: seconds from sending the request to receiving the whole response
+        :param size: response size in bytes
+        :param retries: failed attempts before this response
+        """
+        pass
+
+    def parse(self, provider: str, endpoint: str, seconds: float):
+        """
+        :param seconds: seconds spent turning one response into python objects (json.loads, clean(), DataFrame)
+        """
+        pass
+
+    def operation(self, name: str, count: int, seconds: float):
+        """
+        :param name: operation name, eg: 'buy', 'sell', 'update'
+        :param count: items processed by the operation, eg: fills or holdings
+        :param seconds: seconds spent
+        """
+        pass
+
+
+class Recorder(Metrics):
+    """
+    Metrics kept in memory, thread-safe.
+    Usage:
+        recorder = Recorder()
+        collector = DataCollector(metrics=recorder)
+        collector.get_batch_historical_data(codes, '2021-01-01', '2021-12-31')
+        print(recorder.summary())
+    """
+    enabled = True
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.records = []
+
+    def request(self, provider, endpoint, latency, size, retries=0):
+        with self.lock:
+            self.records.append(("request", f"{provider}.{endpoint}", 1, latency, size, retries))
+
+    def parse(self, provider, endpoint, seconds):
+        with self.lock:
+            self.records.append(("parse", f"{provider}.{endpoint}", 1, seconds, 0, 0))
+
+    def operation(self, name, count, seconds):
+        with self.lock:
+            self.records.append(("operation", name, count, seconds, 0, 0))
+
+    def clear(self):
+        with self.lock:
+            self.records = []
+
+    def to_frame(self) -> DataFrame:
+        with self.lock:
+            records = list(self.records)
+        return pd.DataFrame(records, columns=["kind", "name", "count", "seconds", "bytes", "retries"])
+
+    def summary(self) -> DataFrame:
+        """
+        :return: one row per (kind, name) with calls, items, total / mean / p50 / p99 seconds, bytes, retries and
+        throughput (items per second, eg: fills/s of 'buy')
+        """
+        df = self.to_frame()
+        groups = df.groupby(["kind", "name"])
+        summary = groups.agg(calls=("seconds", "size"), items=("count", "sum"), total=("seconds", "sum"),
+                             mean=("seconds", "mean"), bytes=("bytes", "sum"), retries=("retries", "sum"))
+        summary["p50"] = groups["seconds"].quantile(0.5)
+        summary["p99"] = groups["seconds"].quantile(0.99)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            summary["throughput"] = summary["items"] / summary["total"]
+        return summary[["calls", "items", "total", "mean", "p50", "p99", "bytes", "retries", "throughput"]]
@@ -0,0 +1,344 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import shutil
+import tempfile
+import subprocess
+import numpy as np
+import pandas as pd
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from rwad.data.collector.interface import BASE_URLS, DataCollector
+from rwad.data.collector.async_interface import AsyncDataCollector
+from rwad.backtest.position.position import Bill, Position
+from rwad.backtest.runner import Backtester, FrameSource, Order
+from rwad.backtest.sweep import ParameterSweep
+from rwad.data.store.panel import Panel
+from rwad.metrics import Recorder
+from workloads import random_bars, reversal
+
+data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../examples/data/history_minute_level")
+fixture_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+baseline_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+
+def load_snapshots() -> dict:
+    """
+    Load the cleaned real time snapshots saved by tests/spider.py.
+    :return: a dict of Series keyed by lower-case stock code
+    """
+    snapshots = {}
+    for file in sorted(os.listdir(data_dir)):
+        if file.endswith('.csv'):
+            snapshots[file[: -4].lower()] = pd.read_csv(os.path.join(data_dir, file)).iloc[0]
+    return snapshots
+
+
+def to_raw_text(collector: DataCollector, code: str, snapshot: pd.Series) -> str:
+    """
+    Rebuild the raw Tencent quote response of one stock from its cleaned snapshot.
+    """
+    values = []
+    for key in collector.raw_columns:
+        if 'x' in key:
+            values.append('0')
+        elif key in collector.int_columns:
+            values.append(str(int(snapshot.get(key, 0))))
+        else:
+            values.append(repr(float(snapshot.get(key, 0.))))
+    main, pk = values[: -4], values[-4:]
+    return f'v_{code}="{"~".join(main)}~";\nv_s_pk{code}="{"~".join(pk)}";\n'
+
+
+def bench_clean(n_stocks: int = 4000, rounds: int = 5):
+    collector = DataCollector()
+    snapshots = load_snapshots()
+    samples = list(snapshots.values())
+    # replicate the snapshots to a market-wide universe with unique codes
+    text = ''.join(to_raw_text(collector, f"sz{i:06d}", samples[i % len(samples)]) for i in range(n_stocks))
+    records = collector.split_records(text)
+    codes = [code for code in records if not code.startswith('s_pk')]
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for code in codes:
+            collector.clean(f"{records[code]};{records['s_pk' + code]}")
+    per_record = (time.perf_counter() - start) / rounds
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        df = collector.bulk_clean(text)
+    bulk = (time.perf_counter() - start) / rounds
+
+    assert df.shape == (n_stocks, 62)
+    print(f"clean():      {n_stocks / per_record:12.0f} records/s ({per_record * 1000:.1f} ms per snapshot)")
+    print(f"bulk_clean(): {n_stocks / bulk:12.0f} records/s ({bulk * 1000:.1f} ms per snapshot)")
+    return {"clean": n_stocks / per_record, "bulk_clean": n_stocks / bulk}
+
+
+def bench_backtest(n_stocks: int = 1000, n_days: int = 2500):
+    df_dict = random_bars(n_stocks, n_days)
+    dates = df_dict["sz000000"]["日期"].to_numpy()
+
+    def momentum(bar, engine):
+        # rebalance to the top decile by last close every 20 bars
+        if bar.time not in dates[::20]:
+            return None
+        close = bar.fields["收盘价"]
+        weights = (close >= np.quantile(close, 0.9)) / max(1, np.sum(close >= np.quantile(close, 0.9)))
+        return Order(list(bar.codes), weights=weights * 0.98, prices=close)
+
+    start = time.perf_counter()
+    source = FrameSource(df_dict)
+    load = time.perf_counter() - start
+    backtester = Backtester(source, momentum)
+    start = time.perf_counter()
+    equity = backtester.run()
+    elapsed = time.perf_counter() - start
+
+    assert len(equity) == n_days
+    print(f"backtest:     {backtester.bars / elapsed:12.0f} bars/s ({backtester.bars} bars in {elapsed:.2f} s, "
+          f"source built in {load:.2f} s)")
+    return {"backtest": backtester.bars / elapsed}
+
+
+def bench_sweep(n_stocks: int = 500, n_days: int = 1000):
+    grid = {"window": [5, 10, 20, 40], "top": [0.05, 0.1]}
+    with ParameterSweep(Panel.from_dict(random_bars(n_stocks, n_days))) as sweep:
+        timing = {}
+        for workers in sorted({1, os.cpu_count()}):
+            sweep.workers = workers
+            start = time.perf_counter()
+            stats = sweep.run(reversal, grid)
+            timing[workers] = time.perf_counter() - start
+    print(f"sweep:        {len(stats)} runs, " +
+          ", ".join(f"{workers} workers {elapsed:.2f} s (x{timing[1] / elapsed:.2f})"
+                    for workers, elapsed in timing.items()))
+    return {"sweep": len(stats) / timing[1]}
+
+
+def record_fixtures(path: str = fixture_dir, start_date: str = '2021-01-01', end_date: str = '2021-12-31',
+                    n_codes: int = 20):
+    """
+    Record the raw responses of the first n_codes stocks of the example data from the real providers (needs network
+    access).
+    Files: quote.txt (one Tencent quote response of all the stocks), fqkline_{code}.json and chddata_{code}.csv.
+    """
+    os.makedirs(path, exist_ok=True)
+    codes = sorted(load_snapshots().keys())[: n_codes]
+    collector = DataCollector()
+    with open(os.path.join(path, "quote.txt"), 'wb') as f:
+        f.write(collector.session.get(f"{BASE_URLS['quote']}/q=" +
+                                      ','.join(f"{code},s_pk{code}" for code in codes)).content)
+    for code in codes:
+        collector.get_historical_data(code, start_date, end_date)
+        with open(os.path.join(path, f"fqkline_{code}.json"), 'wb') as f:
+            f.write(collector.requests.content)
+        netease = DataCollector('N')
+        netease.get_historical_data(code, start_date, end_date)
+        with open(os.path.join(path, f"chddata_{code}.csv"), 'wb') as f:
+            f.write(netease.requests.content)
+
+
+def synthesize_fixtures(path: str, n_days: int = 250, n_codes: int = 20):
+    """
+    Build fixtures of the same format as record_fixtures() from the example snapshots and random bars, used when
+    no recorded fixture is available.
+    """
+    os.makedirs(path, exist_ok=True)
+    collector = DataCollector()
+    snapshots = load_snapshots()
+    snapshots = {code: snapshots[code] for code in sorted(snapshots)[: n_codes]}
+    with open(os.path.join(path, "quote.txt"), 'wb') as f:
+        f.write(''.join(to_raw_text(collector, code, snapshot) for code, snapshot in snapshots.items()).encode('gbk'))
+    bars = random_bars(len(snapshots), n_days)
+    for code, df in zip(snapshots, bars.values()):
+        records = [[date] + [f"{value:.2f}" for value in row] for date, row in
+                   zip(df["日期"], df[["开盘价", "收盘价", "最高价", "最低价", "成交量（手）"]].to_numpy())]
+        with open(os.path.join(path, f"fqkline_{code}.json"), 'w') as f:
+            json.dump({"code": 0, "msg": "", "data": {code: {"qfqday": records}}}, f)
+        lines = ["日期,股票代码,名称,收盘价,最高价,最低价,开盘价,前收盘,涨跌额,涨跌幅,成交量"]
+        for date, row in zip(df["日期"][::-1], df.to_numpy()[::-1]):
+            lines.append(f"{date},'{code[2:]},股票,{row[2]:.2f},{row[3]:.2f},{row[4]:.2f},{row[1]:.2f},"
+                         f"None,None,None,{row[5] * 100:.0f}")
+        with open(os.path.join(path, f"chddata_{code}.csv"), 'wb') as f:
+            f.write('\n'.join(lines).encode('gbk'))
+
+
+def serve(path: str):
+    """
+    Local stand-in of the provider endpoints replaying the fixtures in path, prints its url then serves forever.
+    """
+    with open(os.path.join(path, "quote.txt"), 'rb') as f:
+        quotes = DataCollector.split_records(f.read().decode('gbk'))
+    files = {}
+    for file in os.listdir(path):
+        if file.startswith(("fqkline_", "chddata_")):
+            with open(os.path.join(path, file), 'rb') as f:
+                files[file] = f.read()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            query = parse_qs(url.query)
+            body = None
+            content_type = "text/plain; charset=gbk"
+            if url.path.startswith("/q="):
+                records = [quotes.get(name) for name in url.path[3:].split(',')]
+                body = ''.join(f"{record};\n" for record in records if record is not None).encode('gbk')
+            elif url.path.endswith("/fqkline/get"):
+                body = files.get(f"fqkline_{query['param'][0].split(',')[0]}.json")
+                content_type = "application/json"
+            elif url.path.endswith("/chddata.html"):
+                code = query["code"][0]
+                body = files.get(f"chddata_{'sh' if code[0] == '0' else 'sz'}{code[1:]}.csv")
+                content_type = "text/csv; charset=gbk"
+            if body is None:
+                self.send_response(404)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    # the default listen backlog of 5 drops the connections of concurrent clients
+    ThreadingHTTPServer.request_queue_size = 128
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    print(f"http://127.0.0.1:{server.server_address[1]}", flush=True)
+    server.serve_forever()
+
+
+class FixtureServer:
+    """
+    Run serve() in a child process, so the server threads don't share the GIL with the benchmarked collectors.
+    Pass base_urls to the collectors to use it.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.process = None
+        self.url = None
+        self.base_urls = None
+
+    def __enter__(self):
+        self.process = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", self.path],
+                                        stdout=subprocess.PIPE, text=True,
+                                        env={**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)})
+        self.url = self.process.stdout.readline().strip()
+        self.base_urls = {name: self.url for name in BASE_URLS}
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.process.terminate()
+        self.process.wait()
+
+
+def bench_collector(rounds: int = 20):
+    if not os.path.exists(os.path.join(fixture_dir, "quote.txt")):
+        path = tempfile.mkdtemp(prefix="rwad_fixtures_")
+        try:
+            synthesize_fixtures(path)
+            return collect(path, rounds)
+        finally:
+            shutil.rmtree(path)
+    return collect(fixture_dir, rounds)
+
+
+def collect(path: str, rounds: int) -> dict:
+    codes = [file[8: -5] for file in sorted(os.listdir(path)) if file.startswith("fqkline_")]
+    recorder = Recorder()
+
+    with FixtureServer(path) as server:
+        async def fetch_all():
+            async with AsyncDataCollector(metrics=recorder, base_urls=server.base_urls, rate=1000.) as client:
+                return await client.get_batch_historical_data(codes, '2012-01-01', '2012-12-31')
+
+        start = time.perf_counter()
+        df_dict = asyncio.run(fetch_all())
+        concurrent = time.perf_counter() - start
+        assert all(isinstance(df, pd.DataFrame) and len(df) > 0 for df in df_dict.values())
+
+        collector = DataCollector(metrics=recorder, base_urls=server.base_urls)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            df = collector.get_batch_real_time_data(codes, chunk_size=60, as_frame=True)
+        quotes = (time.perf_counter() - start) / rounds
+        assert df.shape == (len(codes), 62)
+
+        start = time.perf_counter()
+        for code in codes:
+            collector.get_historical_data(code, '2012-01-01', '2012-12-31')
+        netease = DataCollector('N', metrics=recorder, base_urls=server.base_urls)
+        for code in codes:
+            netease.get_historical_data(code, '2012-01-01', '2012-12-31')
+        history = time.perf_counter() - start
+
+    print(f"quotes:       {len(codes) / quotes:12.0f} records/s ({len(codes)} codes in {quotes * 1000:.1f} ms)")
+    print(f"history:      {2 * len(codes) / history:12.0f} requests/s sequential, "
+          f"{len(codes) / concurrent:.0f} requests/s async")
+    print(recorder.summary().to_string(float_format=lambda x: f"{x:.6f}"))
+    return {"quotes": len(codes) / quotes, "history": 2 * len(codes) / history,
+            "history_async": len(codes) / concurrent}
+
+
+def bench_position(n_stocks: int = 500, rounds: int = 20):
+    rng = np.random.default_rng(0)
+    codes = [f"sz{i:06d}" for i in range(n_stocks)]
+    recorder = Recorder()
+    position = Position(init_balance=1e9, metrics=recorder)
+    for _ in range(rounds):
+        prices = rng.uniform(5., 50., n_stocks)
+        position.buy([Bill(code, price, int(share)) for code, price, share in
+                      zip(codes, prices, rng.integers(1, 10, n_stocks))], time_rec=False)
+        position.sell([Bill(code, price, int(share)) for code, price, share in
+                       zip(codes, prices, rng.integers(1, 5, n_stocks))], time_rec=False)
+    summary = recorder.summary().loc["operation"]
+    print(f"position:     {summary.loc['buy', 'throughput']:12.0f} fills/s buy, "
+          f"{summary.loc['sell', 'throughput']:.0f} fills/s sell, "
+          f"update() {summary.loc['update', 'mean'] * 1000:.2f} ms for {n_stocks} holdings")
+    return {"position_buy": summary.loc["buy", "throughput"], "position_sell": summary.loc["sell", "throughput"],
+            "position_update": 1. / summary.loc["update", "mean"]}
+
+
+def compare(results: dict, tolerance: float, path: str = baseline_path) -> list:
+    """
+    Compare throughputs (higher is better) with the stored baseline of the same machine.
+    :return: names of the benchmarks slower than (1 - tolerance) x baseline
+    """
+    with open(path, 'r') as f:
+        baseline = json.load(f)
+    regressions = []
+    for name, value in results.items():
+        if name in baseline and value < baseline[name] * (1. - tolerance):
+            regressions.append(name)
+            print(f"REGRESSION {name}: {value:.0f} < {baseline[name]:.0f} x {1. - tolerance:.2f}")
+    return regressions
+
+
+if __name__ == '__main__':
+    # --record: record fixtures from the real providers first
+    # --update-baseline: store the results as the new baseline instead of comparing, the baseline holds absolute
+    #                    throughputs of the local machine, so it is written by the first run and never committed
+    # --tolerance x: allowed slowdown ratio against the baseline, default: 0.3
+    if "--serve" in sys.argv:
+        serve(sys.argv[sys.argv.index("--serve") + 1])
+    if "--record" in sys.argv:
+        record_fixtures()
+    results = {}
+    for bench in [bench_clean, bench_backtest, bench_sweep, bench_position, bench_collector]:
+        results.update(bench())
+    if "--update-baseline" in sys.argv or not os.path.exists(baseline_path):
+        with open(baseline_path, 'w') as f:
+            json.dump({name: round(value, 1) for name, value in results.items()}, f, indent=4)
+        print(f"baseline saved to {baseline_path}")
+    else:
+        tolerance = float(sys.argv[sys.argv.index("--tolerance") + 1]) if "--tolerance" in sys.argv else 0.3
+        sys.exit(1 if compare(results, tolerance) else 0)
@@ -0,0 +1,194 @@
+import time
+import json
+import asyncio
+import aiohttp
+import numpy as np
+import pandas as pd
+import pytest
+
+from aiohttp import web
+from rwad.data.collector.async_interface import AsyncDataCollector, TokenBucket
+from rwad.data.collector.interface import BASE_URLS, DataCollector
+
+
+class StandIn:
+    """
+    Local stand-in of the Tencent endpoints, the behaviour of each code is scripted by the test.
+    """
+    def __init__(self, failures: dict = None, delays: dict = None, latency: float = 0.):
+        """
+        :param failures: code -> number of 500 answers before a valid one (-1 for always)
+        :param delays: code -> seconds slept by the first answer only, to trigger the client timeout
+        :param latency: seconds slept by every answer
+        """
+        self.failures = failures or {}
+        self.delays = delays or {}
+        self.latency = latency
+        self.hits = {}
+        self.active = 0
+        self.max_active = 0
+        self.times = []
+        self.runner = None
+        self.url = None
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_get("/appstock/app/fqkline/get", self.kline)
+        app.router.add_get("/{query:q=.*}", self.quote)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.url = f"http://127.0.0.1:{self.runner.addresses[0][1]}"
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.runner.cleanup()
+
+    @property
+    def base_urls(self) -> dict:
+        return {name: self.url for name in BASE_URLS}
+
+    async def answer(self, code: str, body: str) -> web.Response:
+        self.hits[code] = self.hits.get(code, 0) + 1
+        self.times.append(time.monotonic())
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.latency)
+            if self.hits[code] == 1 and code in self.delays:
+                await asyncio.sleep(self.delays[code])
+            failures = self.failures.get(code, 0)
+            if failures < 0 or self.hits[code] <= failures:
+                return web.Response(status=500)
+            return web.Response(text=body)
+        finally:
+            self.active -= 1
+
+    async def kline(self, request: web.Request) -> web.Response:
+        code = request.query["param"].split(',')[0]
+        bars = [["2021-01-04", "10.00", "10.50", "10.80", "9.90", "1000.00"],
+                ["2021-01-05", "10.50", "10.60", "10.90", "10.40", "1200.00"]]
+        return await self.answer(code, json.dumps({"code": 0, "data": {code: {"qfqday": bars}}}))
+
+    async def quote(self, request: web.Request) -> web.Response:
+        codes = [name for name in request.match_info["query"][2:].split(',') if not name.startswith("s_pk")]
+        return await self.answer(codes[0], ''.join(quote_record(code) for code in codes))
+
+
+def quote_record(code: str) -> str:
+    columns = DataCollector().raw_columns
+    values = ['10.5' if key == "现价" else '20210104150000' if key == "时间戳" else '0' for key in columns]
+    return f'v_{code}="{"~".join(values[: -4])}~";\nv_s_pk{code}="{"~".join(values[-4:])}";\n'
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_retry_with_backoff_after_server_error():
+    async def main():
+        async with StandIn(failures={"sh600519": 2}) as server:
+            async with AsyncDataCollector(retries=3, backoff=0.05, base_urls=server.base_urls) as collector:
+                start = time.monotonic()
+                df = await collector.get_historical_data("sh600519", "2021-01-01", "2021-01-10")
+                return df, time.monotonic() - start, server.hits["sh600519"]
+
+    df, elapsed, hits = run(main())
+    assert hits == 3
+    # backoff of 0.05 s then 0.1 s
+    assert elapsed >= 0.15
+    assert df["收盘价"].tolist() == [10.5, 10.6]
+
+
+def test_retry_after_timeout():
+    async def main():
+        async with StandIn(delays={"sh600519": 1.}) as server:
+            async with AsyncDataCollector(retries=1, backoff=0., timeout=0.3,
+                                          base_urls=server.base_urls) as collector:
+                df = await collector.get_historical_data("sh600519", "2021-01-01", "2021-01-10")
+                return df, server.hits["sh600519"]
+
+    df, hits = run(main())
+    assert hits == 2
+    assert len(df) == 2
+
+
+def test_retries_exhausted():
+    async def main():
+        async with StandIn(failures={"sh600519": -1}) as server:
+            async with AsyncDataCollector(retries=2, backoff=0., base_urls=server.base_urls) as collector:
+                with pytest.raises(aiohttp.ClientResponseError):
+                    await collector.get_historical_data("sh600519", "2021-01-01", "2021-01-10")
+                return server.hits["sh600519"]
+
+    assert run(main()) == 3
+
+
+def test_batch_historical_data_returns_exception_per_code():
+    async def main():
+        async with StandIn(failures={"sz000001": -1}) as server:
+            async with AsyncDataCollector(retries=1, backoff=0., base_urls=server.base_urls) as collector:
+                return await collector.get_batch_historical_data(["sh600519", "sz000001", "sz000002"],
+                                                                 "2021-01-01", "2021-01-10")
+
+    results = run(main())
+    assert isinstance(results["sz000001"], aiohttp.ClientResponseError)
+    assert isinstance(results["sh600519"], pd.DataFrame) and len(results["sh600519"]) == 2
+    assert isinstance(results["sz000002"], pd.DataFrame) and len(results["sz000002"]) == 2
+
+
+def test_batch_real_time_frame_has_nan_rows_for_failed_chunk():
+    codes = ["sh600519", "sh600000", "sz000001", "sz000002"]
+
+    async def main():
+        # the second chunk starts with sz000001
+        async with StandIn(failures={"sz000001": -1}) as server:
+            async with AsyncDataCollector(retries=0, base_urls=server.base_urls) as collector:
+                return await collector.get_batch_real_time_data(codes, chunk_size=2, as_frame=True)
+
+    df = run(main())
+    assert list(df.index) == codes
+    assert (df.loc[["sh600519", "sh600000"], "现价"] == 10.5).all()
+    assert df.loc[["sz000001", "sz000002"]].isna().all(axis=None)
+
+
+def test_semaphore_limits_concurrency():
+    async def main():
+        async with StandIn(latency=0.05) as server:
+            async with AsyncDataCollector(concurrency=3, rate=1000., burst=1000,
+                                          base_urls=server.base_urls) as collector:
+                await collector.get_batch_historical_data([f"sz{i:06d}" for i in range(12)],
+                                                          "2021-01-01", "2021-01-10")
+                return server.max_active
+
+    assert run(main()) == 3
+
+
+def test_token_bucket_limits_rate():
+    async def main():
+        async with StandIn() as server:
+            async with AsyncDataCollector(rate=20., burst=2, base_urls=server.base_urls) as collector:
+                await collector.get_batch_historical_data([f"sz{i:06d}" for i in range(12)],
+                                                          "2021-01-01", "2021-01-10")
+                return np.array(server.times)
+
+    times = run(main())
+    # a burst of 2 then 20 requests per second
+    assert times[-1] - times[0] >= (12 - 2) / 20. * 0.9
+    assert np.sum(times - times[0] < 0.05) <= 3
+
+
+def test_token_bucket_burst():
+    async def main():
+        bucket = TokenBucket(rate=10., capacity=5)
+        start = time.monotonic()
+        for _ in range(5):
+            await bucket.acquire()
+        burst = time.monotonic() - start
+        await bucket.acquire()
+        return burst, time.monotonic() - start
+
+    burst, total = run(main())
+    assert burst < 0.05
+    assert total >= 0.09
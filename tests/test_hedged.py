@@ -0,0 +1,40 @@
+import time
+import pandas as pd
+
+from rwad.data.collector.hedged import HedgedCollector, ProviderHealth
+
+
+def test_available_does_not_claim_the_probe():
+    health = ProviderHealth(threshold=1, cooldown=0.05)
+    health.failure()
+    assert not health.available() and not health.claim()
+    time.sleep(0.06)
+    # ordering checks leave the half open probe to the request actually sent
+    assert health.available() and health.available()
+    assert health.claim()
+    assert not health.claim() and not health.available()
+    health.success(0.1)
+    assert health.available() and health.claim()
+
+
+def test_unrequested_provider_keeps_its_probe():
+    class Stub(HedgedCollector):
+        def fetch(self, provider, code, start_date, end_date, freq, abandoned):
+            self.requested.append(provider)
+            return pd.DataFrame({"日期": ["2021-01-04"]})
+
+    with Stub(providers=['T', 'N'], hedge_delay=1., threshold=1, cooldown=0.05) as collector:
+        collector.requested = []
+        collector.health['T'].success(0.01)
+        collector.health['N'].failure()
+        time.sleep(0.06)
+        for _ in range(3):
+            collector.get_historical_data("sh600519", "2021-01-01", "2021-01-10")
+        assert collector.requested == ['T'] * 3
+        assert collector.health['N'].available()
+
+        # the probe goes to the open provider once the healthy one fails
+        collector.health['T'].failure()
+        collector.get_historical_data("sh600519", "2021-01-01", "2021-01-10")
+        assert collector.requested[-1] == 'N'
+        assert not collector.health['N'].claim()
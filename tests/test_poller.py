@@ -0,0 +1,59 @@
+import time
+import asyncio
+import pandas as pd
+
+from rwad.data.collector.poller import RealTimePoller
+
+
+class Stub:
+    """
+    Collector answering a new snapshot at every call, so every poll gives a delta.
+    """
+    def __init__(self):
+        self.calls = 0
+
+    def get_batch_real_time_data(self, code_list, chunk_size, as_frame):
+        self.calls += 1
+        df = pd.DataFrame(0., index=code_list, columns=RealTimePoller.fields)
+        df["时间戳"] = float(self.calls)
+        return df
+
+
+def wait_until(predicate, timeout: float = 2.) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_break_wakes_blocked_poller():
+    poller = RealTimePoller(Stub(), ["sh600519"], interval=0.01, buffer_size=1, policy='block')
+    for _ in poller:
+        # let the poller fill the buffer and park on the condition
+        time.sleep(0.1)
+        break
+    assert wait_until(lambda: not poller.thread.is_alive())
+
+
+def test_stop_wakes_blocked_poller():
+    poller = RealTimePoller(Stub(), ["sh600519"], interval=0.01, buffer_size=1, policy='block')
+    deltas = iter(poller)
+    next(deltas)
+    time.sleep(0.1)
+    poller.stop()
+    assert wait_until(lambda: not poller.thread.is_alive())
+
+
+def test_stop_ends_async_iteration():
+    async def main():
+        poller = RealTimePoller(Stub(), ["sh600519"], interval=0.01, buffer_size=1, policy='block')
+        count = 0
+        async for _ in poller:
+            count += 1
+            if count == 2:
+                poller.stop()
+        return count
+
+    assert asyncio.run(asyncio.wait_for(main(), timeout=2.)) >= 2
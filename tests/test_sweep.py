@@ -0,0 +1,37 @@
+import os
+import time
+import pytest
+
+from workloads import random_bars, reversal
+from rwad.backtest.sweep import ParameterSweep
+from rwad.data.store.panel import Panel
+
+
+def timed_run(sweep: ParameterSweep, workers: int, grid: dict) -> float:
+    sweep.workers = workers
+    start = time.perf_counter()
+    stats = sweep.run(reversal, grid)
+    assert len(stats) == len(ParameterSweep.combinations(grid))
+    return time.perf_counter() - start
+
+
+@pytest.mark.skipif((os.cpu_count() or 1) < 2, reason="speedup needs at least 2 CPUs")
+def test_sweep_speedup_is_close_to_linear():
+    workers = min(4, os.cpu_count())
+    # enough runs per worker that the pool start-up is negligible
+    grid = {"window": [5, 10, 20, 40], "top": [0.05, 0.1, 0.2, 0.3]}
+    with ParameterSweep(Panel.from_dict(random_bars(500, 1000))) as sweep:
+        timed_run(sweep, workers, {"window": [5], "top": [0.1]})
+        serial = timed_run(sweep, 1, grid)
+        parallel = timed_run(sweep, workers, grid)
+    assert serial / parallel >= 0.7 * workers
+
+
+def test_sweep_results_do_not_depend_on_workers():
+    grid = {"window": [5, 20], "top": [0.1]}
+    with ParameterSweep(Panel.from_dict(random_bars(50, 200))) as sweep:
+        sweep.workers = 1
+        serial = sweep.run(reversal, grid)
+        sweep.workers = 2
+        parallel = sweep.run(reversal, grid)
+    assert serial.equals(parallel)
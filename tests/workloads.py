@@ -0,0 +1,36 @@
+"""
+Synthetic workloads shared by the tests and tests/benchmark.py.
+"""
+import numpy as np
+import pandas as pd
+
+from rwad.backtest.runner import Backtester, PanelSource, Order
+from rwad.data.store.panel import Panel
+
+
+def random_bars(n_stocks: int, n_days: int) -> dict:
+    rng = np.random.default_rng(0)
+    dates = pd.bdate_range('2012-01-01', periods=n_days).strftime('%Y-%m-%d')
+    df_dict = {}
+    for i in range(n_stocks):
+        close = 10. * np.exp(np.cumsum(rng.normal(0., 0.02, n_days)))
+        df_dict[f"sz{i:06d}"] = pd.DataFrame({"日期": dates, "开盘价": close, "收盘价": close, "最高价": close,
+                                              "最低价": close, "成交量（手）": 1000.})
+    return df_dict
+
+
+def reversal(panel: Panel, params: dict, seed: int) -> pd.Series:
+    close = panel.field("收盘价")
+    window = params["window"]
+
+    def strategy(bar, engine):
+        i = int(np.searchsorted(panel.dates, bar.time))
+        if i < window or i % window:
+            return None
+        # buy the worst performers of the last window, sample a random subset to use the seed
+        change = close[i, bar.index] / close[i - window, bar.index]
+        chosen = change <= np.quantile(change, params["top"])
+        chosen &= np.random.random(len(chosen)) < 0.8
+        return Order(list(bar.codes), weights=chosen * 0.98 / max(1, chosen.sum()), prices=close[i, bar.index])
+
+    return Backtester(PanelSource(panel, ["收盘价"]), strategy).run()["equity"]